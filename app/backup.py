@@ -1,69 +1,488 @@
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import json
+import re
 import shutil
+import sqlite3
+import struct
+import time
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 import tempfile
+from . import metrics
+from .cache import bump_data_version
+from .live_updates import change_feed
+from .process_lock import FileLock
+from .config import (
+    BACKUP_DIR,
+    BACKUP_FULL_INTERVAL_DAYS,
+    BACKUP_KEEP_DAILY,
+    BACKUP_KEEP_WEEKLY,
+)
+from .database import engine, init_db, db_writer, on_database_replaced, IS_SQLITE
+
+DATABASE_PATH = engine.url.database
+# 파일 단위 백업/복원은 SQLite 전용 - PostgreSQL 은 pg_dump/관리형 백업을 사용한다
+UNSUPPORTED_MESSAGE = "File backups are only available for SQLite; use pg_dump or managed backups for this database"
+
+# 백업 파일 종류
+#   db_backup_<ts>.full.gz  : 전체 스냅샷 (gzip)
+#   db_backup_<ts>.delta.gz : 직전 백업 대비 변경된 페이지만 담은 증분 백업 (gzip)
+#   db_backup_<ts>.db       : 이전 버전의 압축하지 않은 전체 백업
+#   db_backup_<ts>.pages    : 가장 최근 백업의 페이지별 해시 (다음 증분 계산용)
+BACKUP_FILE_PATTERN = re.compile(
+    r'^db_backup_(?:before_restore_)?(\d{8}_\d{6}(?:_\d{6})?)\.(full\.gz|delta\.gz|db)$'
+)
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S_%f'
+PAGE_DIGEST_SIZE = 16
+DELTA_FORMAT_VERSION = 1
+
+# 다른 워커 프로세스의 백업/복원과도 겹치지 않도록 파일 잠금을 사용한다
+_backup_lock = FileLock("backup.lock")
+
+# 진행 중이거나 마지막으로 실행된 백업의 상태 (/admin/backup/status)
+backup_progress = {
+    "running": False,
+    "phase": None,
+    "path": None,
+    "total_pages": 0,
+    "remaining_pages": 0,
+    "started_at": None,
+    "finished_at": None,
+    "error": None
+}
+
+def _on_progress(status, remaining, total):
+    backup_progress["total_pages"] = total
+    backup_progress["remaining_pages"] = remaining
+
+def online_backup(target_path: str, source_path: str = None):
+    # SQLite 온라인 백업 API로 일관된 스냅샷을 만든다
+    # 한 번의 읽기 트랜잭션(pages=-1)으로 전체를 복사한다 - WAL 모드에서는 읽기가 쓰기를 막지 않으므로
+    # 백업 중에도 동기화/의견 수정이 계속 진행되고, 여러 단계로 나누면 다른 커넥션의 쓰기마다 복사가
+    # 처음부터 다시 시작되어 쓰기가 계속되는 동안 끝나지 않을 수 있다
+    # 임시 파일에 기록한 뒤 이름을 바꾸므로 중간에 실패해도 깨진 백업 파일이 남지 않는다
+    partial_path = f"{target_path}.partial"
+    source = sqlite3.connect(source_path or DATABASE_PATH)
+    try:
+        target = sqlite3.connect(partial_path)
+        try:
+            source.backup(target, pages=-1, progress=_on_progress)
+        finally:
+            target.close()
+        os.replace(partial_path, target_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+    finally:
+        source.close()
+
+def _parse_timestamp(value: str) -> datetime:
+    for fmt in (TIMESTAMP_FORMAT, '%Y%m%d_%H%M%S'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid backup timestamp: {value}")
+
+def _read_delta_header(path: str) -> dict:
+    with gzip.open(path, 'rb') as f:
+        return json.loads(f.readline())
+
+def list_backups() -> list[dict]:
+    # 보관 중인 백업 목록 (오래된 순)
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+
+    backups = []
+    for filename in os.listdir(BACKUP_DIR):
+        match = BACKUP_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        timestamp, suffix = match.groups()
+        path = os.path.join(BACKUP_DIR, filename)
+        kind = {'full.gz': 'full', 'delta.gz': 'delta', 'db': 'legacy'}[suffix]
+        backups.append({
+            "timestamp": timestamp,
+            "created_at": _parse_timestamp(timestamp),
+            "kind": kind,
+            "path": path,
+            "size": os.path.getsize(path),
+            "base": _read_delta_header(path)["base"] if kind == 'delta' else None
+        })
+    backups.sort(key=lambda backup: backup["created_at"])
+    return backups
+
+def find_backup(backups: list[dict], timestamp: str = None):
+    if not backups:
+        return None
+    if timestamp is None:
+        return backups[-1]
+    for backup in backups:
+        if backup["timestamp"] == timestamp:
+            return backup
+    return None
+
+def _read_page_size(path: str) -> int:
+    # SQLite 헤더 16~17 바이트: 페이지 크기 (1 이면 65536)
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    page_size = struct.unpack('>H', header[16:18])[0]
+    return 65536 if page_size == 1 else page_size
+
+def _page_digests(path: str, page_size: int) -> bytes:
+    digests = bytearray()
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            digests += hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest()
+    return bytes(digests)
+
+def _digests_path(backup_path: str) -> str:
+    return re.sub(r'\.(full\.gz|delta\.gz|db)$', '.pages', backup_path)
+
+def _load_digests(backup: dict):
+    path = _digests_path(backup["path"])
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        page_size = struct.unpack('>I', f.read(4))[0]
+        return page_size, f.read()
+
+def _save_digests(backup_path: str, page_size: int, digests: bytes):
+    with open(_digests_path(backup_path), 'wb') as f:
+        f.write(struct.pack('>I', page_size))
+        f.write(digests)
+
+def _write_full(snapshot_path: str, target_path: str):
+    partial_path = f"{target_path}.partial"
+    with open(snapshot_path, 'rb') as src, gzip.open(partial_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(partial_path, target_path)
+
+def _write_delta(snapshot_path: str, target_path: str, base: str, page_size: int,
+                 digests: bytes, base_digests: bytes) -> int:
+    # 직전 백업과 해시가 다른 페이지만 (페이지 번호, 내용) 쌍으로 기록한다
+    page_count = len(digests) // PAGE_DIGEST_SIZE
+    header = {
+        "version": DELTA_FORMAT_VERSION,
+        "base": base,
+        "page_size": page_size,
+        "page_count": page_count
+    }
+    changed = 0
+    partial_path = f"{target_path}.partial"
+    with open(snapshot_path, 'rb') as src, gzip.open(partial_path, 'wb') as dst:
+        dst.write(json.dumps(header).encode('utf-8') + b'\n')
+        for page_number in range(page_count):
+            start = page_number * PAGE_DIGEST_SIZE
+            digest = digests[start:start + PAGE_DIGEST_SIZE]
+            if digest == base_digests[start:start + PAGE_DIGEST_SIZE]:
+                continue
+            src.seek(page_number * page_size)
+            dst.write(struct.pack('>I', page_number))
+            dst.write(src.read(page_size))
+            changed += 1
+    os.replace(partial_path, target_path)
+    return changed
+
+def _apply_delta(delta_path: str, target_path: str):
+    with gzip.open(delta_path, 'rb') as src, open(target_path, 'r+b') as dst:
+        header = json.loads(src.readline())
+        page_size = header["page_size"]
+        while True:
+            page_number = src.read(4)
+            if not page_number:
+                break
+            dst.seek(struct.unpack('>I', page_number)[0] * page_size)
+            dst.write(src.read(page_size))
+        dst.truncate(header["page_count"] * page_size)
+
+def materialize_backup(timestamp: str, target_path: str):
+    # 보관 중인 임의 시점의 백업을 일반 SQLite 파일로 재구성한다
+    backups = list_backups()
+    backup = find_backup(backups, timestamp)
+    if backup is None:
+        raise FileNotFoundError(f"Backup not found: {timestamp}")
+
+    # 증분 백업이면 기준이 되는 전체 백업까지 거슬러 올라간다
+    chain = []
+    while backup["kind"] == 'delta':
+        chain.append(backup)
+        base = find_backup(backups, backup["base"])
+        if base is None:
+            raise FileNotFoundError(f"Base backup missing for {backup['timestamp']}: {backup['base']}")
+        backup = base
+
+    if backup["kind"] == 'full':
+        with gzip.open(backup["path"], 'rb') as src, open(target_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    else:
+        shutil.copyfile(backup["path"], target_path)
+
+    for delta in reversed(chain):
+        _apply_delta(delta["path"], target_path)
+    return target_path
+
+def apply_retention(backups: list[dict] = None) -> list[str]:
+    # 최근 BACKUP_KEEP_DAILY 일, BACKUP_KEEP_WEEKLY 주 각각의 가장 최근 백업과
+    # 그 백업을 재구성하는 데 필요한 기준 백업만 남기고 삭제한다
+    backups = backups if backups is not None else list_backups()
+    if not backups:
+        return []
+
+    keep = {backups[-1]["timestamp"]}
+    daily = {}
+    weekly = {}
+    for backup in reversed(backups):
+        day = backup["created_at"].date()
+        if day not in daily and len(daily) < BACKUP_KEEP_DAILY:
+            daily[day] = backup["timestamp"]
+        week = tuple(backup["created_at"].isocalendar()[:2])
+        if week not in weekly and len(weekly) < BACKUP_KEEP_WEEKLY:
+            weekly[week] = backup["timestamp"]
+    keep.update(daily.values())
+    keep.update(weekly.values())
+
+    by_timestamp = {backup["timestamp"]: backup for backup in backups}
+    for timestamp in list(keep):
+        backup = by_timestamp.get(timestamp)
+        while backup is not None and backup["base"]:
+            keep.add(backup["base"])
+            backup = by_timestamp.get(backup["base"])
+
+    removed = []
+    for backup in backups:
+        if backup["timestamp"] in keep:
+            continue
+        os.unlink(backup["path"])
+        digests_path = _digests_path(backup["path"])
+        if os.path.exists(digests_path):
+            os.unlink(digests_path)
+        removed.append(backup["timestamp"])
+    return removed
 
 def backup_database():
+    # 블로킹 함수이므로 async 핸들러에서는 스레드풀에서 실행해야 한다
+    if not IS_SQLITE:
+        return False, UNSUPPORTED_MESSAGE
+    if not _backup_lock.acquire(blocking=False):
+        return False, "Backup already in progress"
+    snapshot_path = None
+    kind = "unknown"
+    timer = time.perf_counter()
     try:
         # 현재 시간으로 백업 파일명 생성
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_path = f'./backups/db_backup_{timestamp}.db'
+        now = datetime.now()
+        timestamp = now.strftime(TIMESTAMP_FORMAT)
         
         # backups 디렉토리가 없으면 생성
-        os.makedirs('./backups', exist_ok=True)
-        
-        # 데이터베이스 파일 복사
-        shutil.copy2('./sql_app.db', backup_path)
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+
+        backup_progress.update({
+            "running": True,
+            "phase": "snapshot",
+            "path": None,
+            "total_pages": 0,
+            "remaining_pages": 0,
+            "started_at": now,
+            "finished_at": None,
+            "error": None
+        })
         
-        return True, f"Database backed up to {backup_path}"
+        # 1. 데이터베이스 스냅샷 생성
+        snapshot_path = os.path.join(BACKUP_DIR, f'.snapshot_{timestamp}.db')
+        online_backup(snapshot_path)
+
+        # 2. 직전 백업과 페이지 해시를 비교해 전체/증분 백업 결정
+        backup_progress["phase"] = "compress"
+        page_size = _read_page_size(snapshot_path)
+        digests = _page_digests(snapshot_path, page_size)
+
+        backups = list_backups()
+        previous = backups[-1] if backups else None
+        previous_digests = _load_digests(previous) if previous else None
+        last_full = next((b for b in reversed(backups) if b["kind"] != 'delta'), None)
+        full = (
+            previous_digests is None
+            or previous_digests[0] != page_size
+            or last_full is None
+            or now - last_full["created_at"] >= timedelta(days=BACKUP_FULL_INTERVAL_DAYS)
+        )
+
+        if full:
+            backup_path = os.path.join(BACKUP_DIR, f'db_backup_{timestamp}.full.gz')
+            _write_full(snapshot_path, backup_path)
+            message = f"Database backed up to {backup_path}"
+        else:
+            backup_path = os.path.join(BACKUP_DIR, f'db_backup_{timestamp}.delta.gz')
+            changed = _write_delta(
+                snapshot_path, backup_path, previous["timestamp"],
+                page_size, digests, previous_digests[1]
+            )
+            message = (
+                f"Database backed up to {backup_path} "
+                f"({changed}/{len(digests) // PAGE_DIGEST_SIZE} pages changed)"
+            )
+        backup_progress["path"] = backup_path
+        kind = "full" if full else "delta"
+        metrics.backup_size.set(os.path.getsize(backup_path), kind=kind)
+
+        # 다음 증분 계산에는 가장 최근 백업의 해시만 필요하다
+        _save_digests(backup_path, page_size, digests)
+        if previous:
+            previous_digests_path = _digests_path(previous["path"])
+            if os.path.exists(previous_digests_path):
+                os.unlink(previous_digests_path)
+
+        # 3. 보관 정책 적용
+        backup_progress["phase"] = "retention"
+        apply_retention()
+
+        metrics.backup_duration.observe(time.perf_counter() - timer, kind=kind, outcome="ok")
+        metrics.backup_last_success.set(time.time())
+        return True, message
     except Exception as e:
+        backup_progress["error"] = str(e)
+        metrics.backup_duration.observe(time.perf_counter() - timer, kind=kind, outcome="error")
         return False, str(e)
+    finally:
+        if snapshot_path and os.path.exists(snapshot_path):
+            os.unlink(snapshot_path)
+        backup_progress["running"] = False
+        backup_progress["phase"] = None
+        backup_progress["finished_at"] = datetime.now()
+        _backup_lock.release()
+
+# 복원 시 검증하는 ads 테이블 필수 컬럼
+REQUIRED_AD_COLUMNS = {
+    'id', 'ad_id', 'ad_name', 'last_modified', 'is_active', 'created_at'
+}
+# 팀/계정/캠페인/광고 그룹/거절 사유 - 차원 테이블 id (현재) 또는 이름 문자열 (이전 버전, 복원 후 마이그레이션)
+AD_DIMENSION_COLUMNS = (
+    {'team_id', 'campaign_id', 'adgroup_id', 'account_id', 'reject_reason_id'},
+    {'team', 'campaign', 'adgroup', 'account_name', 'reject_reason'},
+)
+# 업로드 파일을 디스크에 기록하는 단위 (바이트)
+RESTORE_CHUNK_SIZE = 1024 * 1024
+
+_restore_lock = FileLock("restore.lock")
 
-def restore_latest_backup():
+def _staging_path() -> str:
+    # os.replace 가 원자적으로 동작하도록 DB 파일과 같은 디렉토리에 만든다
+    fd, path = tempfile.mkstemp(
+        prefix='.restore_',
+        suffix='.db',
+        dir=os.path.dirname(os.path.abspath(DATABASE_PATH))
+    )
+    os.close(fd)
+    return path
+
+def verify_database(path: str):
+    # 무결성 검사와 스키마 확인을 통과하지 못하면 ValueError
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise ValueError(f"Not a SQLite database: {e}")
     try:
-        # backups 디렉토리에서 가장 최근 백업 파일 찾기
-        backup_files = [f for f in os.listdir('./backups') if f.startswith('db_backup_')]
-        if not backup_files:
+        result = conn.execute("PRAGMA integrity_check").fetchall()
+        if result != [('ok',)]:
+            raise ValueError(f"Integrity check failed: {result[0][0]}")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(ads)")}
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Not a valid SQLite database: {e}")
+    finally:
+        conn.close()
+    if not columns:
+        raise ValueError("Missing table: ads")
+    missing = REQUIRED_AD_COLUMNS - columns
+    if not any(dimension_columns <= columns for dimension_columns in AD_DIMENSION_COLUMNS):
+        missing |= AD_DIMENSION_COLUMNS[0] - columns
+    if missing:
+        raise ValueError(f"Missing columns in ads: {', '.join(sorted(missing))}")
+
+def swap_database(staged_path: str):
+    # 검증된 파일을 DB 자리로 원자적으로 교체하고 커넥션 풀을 다시 만든다
+    # 교체 전에 풀을 비워 기존 파일을 가리키는 커넥션이 재사용되지 않게 한다
+    engine.dispose()
+    os.replace(staged_path, DATABASE_PATH)
+    # 이전 DB의 저널/WAL 파일이 새 DB에 적용되지 않도록 제거
+    for suffix in ('-journal', '-wal', '-shm'):
+        stale_path = DATABASE_PATH + suffix
+        if os.path.exists(stale_path):
+            os.unlink(stale_path)
+    engine.dispose()
+    for callback in on_database_replaced:
+        callback()
+
+    # 이전 버전에서 만든 DB라면 새 테이블/인덱스와 집계/검색 색인을 채운다
+    init_db()
+    bump_data_version()
+    # 열려 있는 대시보드는 표 전체를 다시 불러온다
+    change_feed.publish_reset()
+
+def _restore_staged(staged_path: str):
+    verify_database(staged_path)
+
+    # 현재 DB 백업 (보관 정책이 적용되는 일반 백업으로 남긴다)
+    success, message = backup_database()
+    if not success:
+        raise RuntimeError(f"Backup before restore failed: {message}")
+
+    # 진행 중인 쓰기(동기화 저장, 의견 수정)가 끝난 뒤 교체하고, 교체하는 동안 새 쓰기는 기다린다
+    db_writer.run(swap_database, staged_path)
+
+def restore_latest_backup(timestamp: str = None):
+    # timestamp 를 지정하면 해당 시점, 없으면 가장 최근 백업으로 복원한다
+    if not IS_SQLITE:
+        return False, UNSUPPORTED_MESSAGE
+    if not _restore_lock.acquire(blocking=False):
+        return False, "Restore already in progress"
+    staged_path = None
+    try:
+        backup = find_backup(list_backups(), timestamp)
+        if backup is None:
             return False, "No backup files found"
-            
-        latest_backup = max(backup_files)
-        backup_path = os.path.join('./backups', latest_backup)
-        
-        # 현재 DB 파일 교체
-        shutil.copy2(backup_path, './sql_app.db')
+
+        staged_path = _staging_path()
+        materialize_backup(backup["timestamp"], staged_path)
+        _restore_staged(staged_path)
         
-        return True, f"Database restored from {backup_path}"
+        return True, f"Database restored from {backup['path']}"
     except Exception as e:
         return False, str(e)
+    finally:
+        if staged_path and os.path.exists(staged_path):
+            os.unlink(staged_path)
+        _restore_lock.release()
 
 async def restore_from_upload(file: UploadFile):
+    # 업로드를 청크 단위로 디스크에 기록하고, 검증/교체 등 블로킹 작업은 스레드풀에서 실행한다
+    if not IS_SQLITE:
+        return False, f"Failed to restore database: {UNSUPPORTED_MESSAGE}"
+    if not _restore_lock.acquire(blocking=False):
+        return False, "Failed to restore database: Restore already in progress"
+    staged_path = None
     try:
-        # 임시 파일 생성
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # 업로드된 파일 내용을 임시 파일에 복사
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        staged_path = await run_in_threadpool(_staging_path)
+        with open(staged_path, 'wb') as staged_file:
+            while True:
+                chunk = await file.read(RESTORE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(staged_file.write, chunk)
 
-        try:
-            # 현재 DB 파일 백업
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = f'./backups/db_backup_before_restore_{timestamp}.db'
-            os.makedirs('./backups', exist_ok=True)
-            shutil.copy2('./sql_app.db', backup_path)
-
-            # 업로드된 파일을 DB 파일로 복사
-            shutil.copy2(temp_path, './sql_app.db')
-            
-            # 임시 파일 삭제
-            os.unlink(temp_path)
-            
-            return True, "Database restored successfully from uploaded file"
-        except Exception as e:
-            # 에러 발생 시 임시 파일 삭제
-            os.unlink(temp_path)
-            raise e
-            
+        await run_in_threadpool(_restore_staged, staged_path)
+        
+        return True, "Database restored successfully from uploaded file"
     except Exception as e:
-        return False, f"Failed to restore database: {str(e)}"
\ No newline at end of file
+        return False, f"Failed to restore database: {str(e)}"
+    finally:
+        if staged_path and os.path.exists(staged_path):
+            os.unlink(staged_path)
+        _restore_lock.release()
@@ -0,0 +1,88 @@
+# cache.py
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+from .config import RESPONSE_CACHE_SIZE
+from .process_lock import lock_path
+
+class SharedVersion:
+    # 워커 프로세스들이 공유하는 데이터 버전 표식 파일
+    # 데이터를 바꾼 프로세스가 파일을 새로 쓰면 다른 프로세스는 stat 결과가 달라진 것으로 알아챈다
+    def __init__(self, name: str = "data_version"):
+        self.path = lock_path(name)
+        self._seen = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def changed(self) -> bool:
+        signature = self._signature()
+        if signature == self._seen:
+            return False
+        self._seen = signature
+        return True
+
+    def touch(self):
+        # 임시 파일을 쓴 뒤 교체해 항상 새 inode 가 되게 한다
+        # 자기 변경도 다음 changed() 에서 한 번 더 감지되지만 캐시를 한 번 더 비울 뿐이다
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temp_path, "w") as f:
+            f.write(f"{os.getpid()} {time.time_ns()}\n")
+        os.replace(temp_path, self.path)
+
+# 조회 API 응답 캐시
+# 데이터가 바뀌는 경로(동기화, 의견 수정, 복원)가 bump() 로 데이터 버전을 올리면
+# 이전 버전으로 만들어진 항목은 모두 무효가 된다. ETag 는 본문 해시만으로 만들어
+# 버전 번호가 서로 다른 워커 프로세스도 같은 내용이면 같은 ETag 를 돌려준다(로드 밸런서 뒤에서도 304).
+# 다른 워커 프로세스가 데이터를 바꾼 경우는 get() 에서 공유 버전 파일을 확인해 반영한다.
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, shared: SharedVersion = None):
+        self.max_entries = max_entries
+        self.version = 0
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.touch()
+
+    def get(self, key):
+        # (etag, body) 또는 None
+        with self._lock:
+            if self.shared is not None and self.shared.changed():
+                self.version += 1
+                self._entries.clear()
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, body: bytes, version: int):
+        # version: 응답을 만들기 시작할 때의 데이터 버전
+        # 만드는 도중 데이터가 바뀌었다면 캐시하지 않고 ETag 만 돌려준다
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = (etag, body)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+response_cache = ResponseCache(shared=SharedVersion())
+
+def bump_data_version():
+    response_cache.bump()
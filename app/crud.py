@@ -1,8 +1,91 @@
 # crud.py
-from sqlalchemy import distinct, func
+from sqlalchemy import and_, case, distinct, false, func, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import dimensions, models, schemas, search
+from .cache import bump_data_version
+from collections import Counter
 from datetime import datetime
+from types import SimpleNamespace
+
+# IN (...) 절 하나에 넣을 최대 파라미터 수 (SQLite 변수 개수 제한 대비)
+IN_CLAUSE_CHUNK_SIZE = 900
+# PostgreSQL 에서 변경 로그 기록을 커밋 순서대로 줄 세우는 advisory lock 키
+CHANGE_LOG_LOCK_KEY = 7320115
+
+# 동기화 시 이 필드 중 하나라도 바뀐 광고만 변경 로그(ad_changes)에 남긴다 - /ads/changes 와 대시보드 실시간 갱신이 읽는다
+LIVE_COMPARED_FIELDS = (
+    "team", "account_name", "campaign", "adgroup", "ad_name", "reject_reason", "is_active"
+)
+
+def _chunks(items: list, size: int = IN_CLAUSE_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _insert(db: Session, table):
+    # INSERT ... ON CONFLICT 를 지원하는 방언별 insert 구문
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def _dimension_filter(db: Session, field: str, name: str, model=models.Ad):
+    # 이름 조건을 외래 키 조건으로 바꾼다 (없는 이름이면 결과가 없다)
+    dimension_id = dimensions.maps[field].id(db, name)
+    if dimension_id is None:
+        return false()
+    return dimensions.id_column(field, model) == dimension_id
+
+# 외래 키 컬럼 이름 -> 이름 필드 (예: "team_id" -> "team")
+_FIELD_BY_ID_COLUMN = {id_column: field for field, (_, id_column) in dimensions.FIELDS.items()}
+
+def _with_names(db: Session, rows):
+    # 외래 키 컬럼(team_id 등)으로 읽은 행을 이름 필드(team 등)를 가진 객체로 바꾼다
+    # 컬럼 구성은 모든 행이 같으므로 첫 행에서 한 번만 계산한다
+    keys = None
+    for row in rows:
+        if keys is None:
+            keys = [_FIELD_BY_ID_COLUMN.get(key, key) for key in row._fields]
+            lookups = {
+                _FIELD_BY_ID_COLUMN[key]: dimensions.NameLookup(db, _FIELD_BY_ID_COLUMN[key])
+                for key in row._fields if key in _FIELD_BY_ID_COLUMN
+            }
+        values = dict(zip(keys, row))
+        for field, lookup in lookups.items():
+            values[field] = lookup[values[field]]
+        yield SimpleNamespace(**values)
+
+def _rollup_key(created_at: datetime, team: str, account_name: str, campaign: str, reject_reason: str):
+    # 일별 집계 테이블의 키 (NULL 은 유니크 제약에서 서로 다른 값으로 취급되므로 빈 문자열로 저장)
+    return (created_at.date(), team or "", account_name or "", campaign or "", reject_reason or "")
+
+def _apply_rollup_deltas(db: Session, deltas: Counter):
+    table = models.AdRejectionDaily.__table__
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ids = {
+        field: dimensions.maps[field].intern(db, {key[position] for key in deltas})
+        for position, field in enumerate(("team", "account_name", "campaign", "reject_reason"), start=1)
+    }
+    rows = [
+        {
+            "day": day,
+            "team_id": ids["team"][team],
+            "account_id": ids["account_name"][account_name],
+            "campaign_id": ids["campaign"][campaign],
+            "reject_reason_id": ids["reject_reason"][reject_reason],
+            "rejections": delta
+        }
+        for (day, team, account_name, campaign, reject_reason), delta in deltas.items()
+    ]
+    stmt = _insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            table.c.day, table.c.team_id, table.c.account_id, table.c.campaign_id, table.c.reject_reason_id
+        ],
+        set_={"rejections": table.c.rejections + stmt.excluded.rejections}
+    )
+    db.execute(stmt, rows)
 
 def get_ad(db: Session, ad_id: str):
     return db.query(models.Ad).filter(models.Ad.ad_id == ad_id).first()
@@ -12,35 +95,399 @@ def get_ads(
     skip: int = 0, 
     limit: int = 100, 
     team: str = None,
-    active_only: bool = True
+    active_only: bool = True,
+    after_id: int = None
 ):
+    # after_id 가 주어지면 OFFSET 대신 id 키셋으로 다음 페이지를 조회한다
     query = db.query(models.Ad)
     if team:
-        query = query.filter(models.Ad.team == team)
+        query = query.filter(_dimension_filter(db, "team", team))
     if active_only:
         query = query.filter(models.Ad.is_active == True)
+    query = query.order_by(models.Ad.id)
+    if after_id is not None:
+        return query.filter(models.Ad.id > after_id).limit(limit).all()
     return query.offset(skip).limit(limit).all()
 
 def create_or_update_ad(db: Session, ad: schemas.AdCreate):
-    existing_ad = get_ad(db, ad.ad_id)
-    
-    if existing_ad:
-        for key, value in ad.dict(exclude_unset=True).items():
-            setattr(existing_ad, key, value)
-        existing_ad.last_modified = datetime.utcnow()
-    else:
-        db_ad = models.Ad(**ad.dict())
-        db.add(db_ad)
-    
+    # 단건 저장도 일괄 저장과 같은 경로(집계/이벤트 기록 포함)를 사용한다
+    bulk_upsert_ads(db, [ad], deactivate_missing=False)
+    return get_ad(db, ad.ad_id)
+
+def _with_dimension_ids(db: Session, rows: list[dict], fields: tuple) -> list[dict]:
+    # 이름 필드(team 등)를 외래 키 컬럼(team_id 등)으로 바꾼다 (처음 보는 이름은 이 트랜잭션에서 추가)
+    # rows 는 저장용으로 만든 임시 dict 이므로 그 자리에서 바꾼다
+    ids = [
+        (field, dimensions.FIELDS[field][1], dimensions.maps[field].intern(db, (row[field] for row in rows)))
+        for field in fields
+    ]
+    for row in rows:
+        for field, id_column, field_ids in ids:
+            row[id_column] = field_ids.get(row.pop(field))
+    return rows
+
+def _record_events(db: Session, events: list[dict]):
+    if events:
+        db.execute(
+            models.AdRejectionEvent.__table__.insert(),
+            _with_dimension_ids(db, events, ("team", "account_name", "reject_reason"))
+        )
+
+def _log_changes(db: Session, changes: list[tuple]):
+    # changes: (ad_id, team, op) - models.AdChange 에 순서대로 기록
+    if changes:
+        if db.bind.dialect.name == "postgresql":
+            # seq 를 받은 트랜잭션끼리 커밋 순서가 바뀌면 seq 순서로 읽는 쪽(/ads/changes, 실시간 갱신)이
+            # 늦게 커밋된 작은 seq 를 건너뛴다 - 커밋할 때까지 잠가 seq 순서와 커밋 순서를 맞춘다
+            # (SQLite 는 BEGIN IMMEDIATE 로 쓰기 트랜잭션이 이미 한 번에 하나다)
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK_KEY})
+        now = datetime.utcnow()
+        db.execute(models.AdChange.__table__.insert(), _with_dimension_ids(db, [
+            {"ad_id": ad_id, "team": team, "op": op, "changed_at": now}
+            for ad_id, team, op in changes
+        ], ("team",)))
+
+def _rejection_event(event_type: str, ad_id: str, team: str, account_name: str,
+                     reject_reason: str, occurred_at: datetime):
+    return {
+        "event_type": event_type,
+        "ad_id": ad_id,
+        "team": team,
+        "account_name": account_name,
+        "reject_reason": reject_reason,
+        "occurred_at": occurred_at
+    }
+
+def _deactivate_rows(db: Session, rows: list):
+    # rows: (ad_id, team, account_name, reject_reason) - 현재 활성 상태인 광고
+    now = datetime.utcnow()
+    for chunk in _chunks([row.ad_id for row in rows]):
+        db.query(models.Ad)\
+            .filter(models.Ad.ad_id.in_(chunk))\
+            .update({models.Ad.is_active: False}, synchronize_session=False)
+    _record_events(db, [
+        _rejection_event(
+            models.AdRejectionEvent.CLEARED, row.ad_id, row.team, row.account_name,
+            row.reject_reason, now
+        )
+        for row in rows
+    ])
+    _log_changes(db, [(row.ad_id, row.team, models.AdChange.DEACTIVATE) for row in rows])
+    return len(rows)
+
+def _active_rows(db: Session, *conditions) -> list:
+    return list(_with_names(db, db.query(
+        models.Ad.ad_id,
+        models.Ad.team_id,
+        models.Ad.account_id,
+        models.Ad.reject_reason_id
+    ).filter(models.Ad.is_active == True, *conditions)))
+
+def deactivate_old_ads(
+    db: Session,
+    current_ad_ids: list[str],
+    commit: bool = True,
+    skip_account_names: list[str] = None
+):
+    # 거대한 NOT IN 목록 대신 활성 광고를 한 번 조회해 차집합을 계산한다
+    # skip_account_names: 이번 동기화에서 조회에 실패한 계정 - 해당 계정의 광고는 비활성화하지 않는다
+    current = set(current_ad_ids)
+    skipped = set(skip_account_names or ())
+    stale_rows = [
+        row for row in _active_rows(db)
+        if row.ad_id not in current and row.account_name not in skipped
+    ]
+    deactivated = _deactivate_rows(db, stale_rows)
+    if commit:
+        db.commit()
+        bump_data_version()
+    return deactivated
+
+def deactivate_unseen_ads(
+    db: Session,
+    seen_since: datetime,
+    commit: bool = True,
+    skip_account_names: list[str] = None
+):
+    # seen_since 이후 동기화에서 받지 못한 활성 광고 비활성화 (여러 트랜잭션에 나눠 저장한 전체 동기화의 마무리)
+    # skip_account_names: 이번 동기화를 끝내지 못한 계정 - 해당 계정의 광고는 비활성화하지 않는다
+    skipped = set(skip_account_names or ())
+    stale_rows = [
+        row for row in _active_rows(db, or_(models.Ad.last_seen_at.is_(None), models.Ad.last_seen_at < seen_since))
+        if row.account_name not in skipped
+    ]
+    deactivated = _deactivate_rows(db, stale_rows)
+    if commit:
+        db.commit()
+        bump_data_version()
+    return deactivated
+
+def deactivate_ads(db: Session, ad_ids: list[str], commit: bool = True):
+    # 지정한 광고 중 활성 상태인 것만 비활성화
+    rows = []
+    for chunk in _chunks(list(ad_ids)):
+        rows.extend(_active_rows(db, models.Ad.ad_id.in_(chunk)))
+    deactivated = _deactivate_rows(db, rows)
+    if commit:
+        db.commit()
+        bump_data_version()
+    return deactivated
+
+def _ad_row(row: dict, ids: dict) -> dict:
+    # 스키마 필드(이름) -> ads 테이블 컬럼(id)
+    values = {key: value for key, value in row.items() if key not in dimensions.FIELDS}
+    for field, (_, id_column) in dimensions.FIELDS.items():
+        values[id_column] = ids[field].get(row.get(field))
+    return values
+
+def bulk_upsert_ads(
+    db: Session,
+    ads: list[schemas.AdCreate],
+    deactivate_missing: bool = True,
+    commit: bool = True,
+    skip_account_names: list[str] = None
+):
+    # 동기화 결과 전체를 하나의 트랜잭션으로 저장한다
+    # create_or_update_ad 와 같은 규칙을 따른다:
+    #   - 신규 광고는 모든 필드를 저장
+    #   - 기존 광고는 호출자가 지정한 필드만 갱신하고 last_modified 를 현재 시각으로 설정
+    now = datetime.utcnow()
+    table = models.Ad.__table__
+
+    # 같은 ad_id가 여러 번 오면 마지막 값을 사용
+    ads_by_id = {ad.ad_id: ad for ad in ads}
+    ad_ids = list(ads_by_id)
+
+    # 기존 행을 한 번에 읽어 신규/갱신을 구분하고 일별 집계 변화량을 계산한다
+    existing = {}
+    for chunk in _chunks(ad_ids):
+        for row in _with_names(db, db.query(
+            models.Ad.ad_id,
+            models.Ad.created_at,
+            models.Ad.team_id,
+            models.Ad.account_id,
+            models.Ad.campaign_id,
+            models.Ad.adgroup_id,
+            models.Ad.ad_name,
+            models.Ad.reject_reason_id,
+            models.Ad.is_active,
+            models.Ad.planner_comment,
+            models.Ad.executor_comment
+        ).filter(models.Ad.ad_id.in_(chunk))):
+            existing[row.ad_id] = row
+
+    # ON CONFLICT 로 갱신할 컬럼 조합별로 묶어 executemany 로 실행한다
+    groups = {}
+    rollup_deltas = Counter()
+    events = []
+    change_log = []
+    for ad in ads_by_id.values():
+        values = ad.dict(exclude_unset=True)
+        update_keys = tuple(sorted(key for key in values if key != "ad_id"))
+        row = ad.dict()
+        row["created_at"] = now
+        row["last_seen_at"] = now
+        groups.setdefault(update_keys, []).append(row)
+
+        previous = existing.get(ad.ad_id)
+        event_type = None
+        if previous is None:
+            event_type = models.AdRejectionEvent.REJECTED
+        elif values.get("is_active", previous.is_active) and not previous.is_active:
+            event_type = models.AdRejectionEvent.REJECTED_AGAIN
+        elif previous.is_active and values.get("reject_reason", previous.reject_reason) != previous.reject_reason:
+            event_type = models.AdRejectionEvent.REASON_CHANGED
+        if event_type and ad.is_active:
+            events.append(_rejection_event(
+                event_type, ad.ad_id, ad.team, ad.account_name, ad.reject_reason, now
+            ))
+
+        # 대시보드에 보이는 필드가 바뀐 광고만 변경 로그에 남긴다 (last_modified 갱신만으로는 남기지 않음)
+        if previous is None:
+            change_log.append((ad.ad_id, ad.team, models.AdChange.INSERT))
+        else:
+            shown = {key: values.get(key, getattr(previous, key)) for key in LIVE_COMPARED_FIELDS}
+            if any(shown[key] != getattr(previous, key) for key in LIVE_COMPARED_FIELDS):
+                change_log.append((ad.ad_id, shown["team"], models.AdChange.UPDATE))
+                if shown["team"] != previous.team:
+                    # 이전 팀 기준으로 조회하는 클라이언트도 이 광고가 빠졌음을 알 수 있게 한다
+                    change_log.append((ad.ad_id, previous.team, models.AdChange.UPDATE))
+
+        if previous is None:
+            rollup_deltas[_rollup_key(now, ad.team, ad.account_name, ad.campaign, ad.reject_reason)] += 1
+        elif previous.created_at is not None:
+            old_key = _rollup_key(
+                previous.created_at, previous.team, previous.account_name,
+                previous.campaign, previous.reject_reason
+            )
+            new_key = _rollup_key(
+                previous.created_at,
+                values.get("team", previous.team),
+                values.get("account_name", previous.account_name),
+                values.get("campaign", previous.campaign),
+                values.get("reject_reason", previous.reject_reason)
+            )
+            if old_key != new_key:
+                rollup_deltas[old_key] -= 1
+                rollup_deltas[new_key] += 1
+
+    try:
+        # 이름을 차원 id 로 바꿔 저장한다 (처음 보는 이름은 이 트랜잭션에서 차원 테이블에 추가)
+        ids = {
+            field: dimensions.maps[field].intern(db, (row[field] for rows in groups.values() for row in rows))
+            for field in dimensions.FIELDS
+        }
+        for update_keys, rows in groups.items():
+            stmt = _insert(db, table)
+            columns = [dimensions.FIELDS[key][1] if key in dimensions.FIELDS else key for key in update_keys]
+            set_ = {column: stmt.excluded[column] for column in columns}
+            set_["last_modified"] = now
+            set_["last_seen_at"] = now
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c.ad_id], set_=set_)
+            db.execute(stmt, [_ad_row(row, ids) for row in rows])
+
+        _apply_rollup_deltas(db, rollup_deltas)
+        _record_events(db, events)
+        _log_changes(db, change_log)
+        # 신규/표시 필드가 바뀐 광고만 검색 색인을 갱신한다
+        search.index_ads(db, list(dict.fromkeys(ad_id for ad_id, _, _ in change_log)))
+        deactivated = deactivate_old_ads(
+            db, ad_ids, commit=False, skip_account_names=skip_account_names
+        ) if deactivate_missing else 0
+        if commit:
+            db.commit()
+            bump_data_version()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "inserted": len(ad_ids) - len(existing),
+        "updated": len(existing),
+        "deactivated": deactivated
+    }
+
+def get_rejection_events(
+    db: Session,
+    team: str = None,
+    account_name: str = None,
+    event_type: str = None,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    # (team, occurred_at) / (account_name, occurred_at) 인덱스 범위 조회
+    events = models.AdRejectionEvent
+    query = db.query(events)
+    if team:
+        query = query.filter(_dimension_filter(db, "team", team, events))
+    if account_name:
+        query = query.filter(_dimension_filter(db, "account_name", account_name, events))
+    if event_type:
+        query = query.filter(events.event_type == event_type)
+    if start_date:
+        query = query.filter(events.occurred_at >= start_date)
+    if end_date:
+        query = query.filter(events.occurred_at <= end_date)
+    return query.order_by(events.occurred_at.desc(), events.id.desc()).offset(skip).limit(limit).all()
+
+def get_ad_change_bounds(db: Session):
+    # (가장 오래된 seq, 가장 최근 seq) - 로그가 비어 있으면 (None, None)
+    changes = models.AdChange
+    return db.query(func.min(changes.seq), func.max(changes.seq)).one()
+
+def get_ad_changes(db: Session, after_seq: int, team: str = None, limit: int = 500):
+    # (team, seq) 인덱스 범위 조회
+    changes = models.AdChange
+    query = db.query(changes.seq, changes.ad_id, changes.team_id, changes.op)\
+        .filter(changes.seq > after_seq)
+    if team:
+        query = query.filter(_dimension_filter(db, "team", team, changes))
+    return list(_with_names(db, query.order_by(changes.seq).limit(limit)))
+
+def get_ads_by_ids(db: Session, ad_ids: list[str]) -> dict:
+    ads = {}
+    for chunk in _chunks(list(ad_ids)):
+        for ad in db.query(models.Ad).filter(models.Ad.ad_id.in_(chunk)):
+            ads[ad.ad_id] = ad
+    return ads
+
+def prune_ad_changes(db: Session, before: datetime) -> int:
+    # 보관 기간이 지난 변경 로그 삭제 (최신 seq 는 항상 남겨 커서 기준점을 유지한다)
+    changes = models.AdChange
+    _, max_seq = get_ad_change_bounds(db)
+    if max_seq is None:
+        return 0
+    deleted = db.query(changes)\
+        .filter(changes.changed_at < before, changes.seq < max_seq)\
+        .delete(synchronize_session=False)
     db.commit()
-    return existing_ad if existing_ad else db_ad
+    return deleted
 
-def deactivate_old_ads(db: Session, current_ad_ids: list[str]):
-    db.query(models.Ad)\
-        .filter(models.Ad.is_active == True)\
-        .filter(models.Ad.ad_id.notin_(current_ad_ids))\
-        .update({models.Ad.is_active: False}, synchronize_session=False)
+def get_sync_checkpoints(db: Session):
+    return {
+        checkpoint.account_id: checkpoint
+        for checkpoint in db.query(models.SyncCheckpoint).all()
+    }
+
+def save_sync_checkpoint(
+    db: Session,
+    account_id: str,
+    team: str,
+    account_name: str,
+    synced_at: datetime,
+    last_updated_time: datetime = None,
+    full: bool = False,
+    run_id: int = None
+):
+    # 커밋은 호출자가 동기화 결과와 함께 수행한다
+    checkpoint = db.get(models.SyncCheckpoint, account_id)
+    if checkpoint is None:
+        checkpoint = models.SyncCheckpoint(account_id=account_id)
+        db.add(checkpoint)
+    checkpoint.team = team
+    checkpoint.account_name = account_name
+    checkpoint.last_synced_at = synced_at
+    if last_updated_time and (
+        checkpoint.last_updated_time is None or last_updated_time > checkpoint.last_updated_time
+    ):
+        checkpoint.last_updated_time = last_updated_time
+    if full:
+        checkpoint.last_full_sync = synced_at
+    if run_id is not None:
+        checkpoint.last_run_id = run_id
+    return checkpoint
+
+def get_resumable_sync_run(db: Session):
+    # 끝나지 않은(중단된) 가장 최근 동기화 실행
+    runs = models.SyncRun
+    return db.query(runs).filter(runs.status == runs.RUNNING).order_by(runs.id.desc()).first()
+
+def get_completed_sync_accounts(db: Session, run_id: int) -> set:
+    # 해당 실행에서 저장까지 끝낸 계정 ID
+    checkpoints = models.SyncCheckpoint
+    return {
+        account_id
+        for account_id, in db.query(checkpoints.account_id).filter(checkpoints.last_run_id == run_id)
+    }
+
+def start_sync_run(db: Session, full: bool, started_at: datetime) -> int:
+    # 이어서 실행하지 않는 중단된 실행은 버리고 새 실행을 기록한다
+    runs = models.SyncRun
+    db.query(runs).filter(runs.status == runs.RUNNING)\
+        .update({runs.status: runs.ABANDONED, runs.finished_at: datetime.utcnow()}, synchronize_session=False)
+    run = runs(full=full, status=runs.RUNNING, started_at=started_at)
+    db.add(run)
     db.commit()
+    return run.id
+
+def finish_sync_run(db: Session, run_id: int):
+    # 커밋은 호출자가 마무리 작업(비활성화)과 함께 수행한다
+    run = db.get(models.SyncRun, run_id)
+    run.status = models.SyncRun.FINISHED
+    run.finished_at = datetime.utcnow()
+    return run
 
 def update_ad_comments(db: Session, ad_id: str, comments: schemas.AdUpdate):
     ad = get_ad(db, ad_id)
@@ -52,44 +499,209 @@ def update_ad_comments(db: Session, ad_id: str, comments: schemas.AdUpdate):
     if comments.executor_comment is not None:
         ad.executor_comment = comments.executor_comment
     ad.last_modified = datetime.utcnow()
+    _log_changes(db, [(ad.ad_id, ad.team, models.AdChange.UPDATE)])
+    db.flush()
+    search.index_ads(db, [ad.ad_id])
     
     db.commit()
+    bump_data_version()
     db.refresh(ad)
     return ad
 
+def search_ads(
+    db: Session,
+    query: str,
+    team: str = None,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    active: bool = None,
+    skip: int = 0,
+    limit: int = 50
+):
+    # 광고 이름/캠페인/광고 그룹/계정/거절 사유/의견 전문 검색 (모든 검색어를 포함하는 광고)
+    # 3글자 이상 검색어는 FTS5 색인으로 찾아 bm25 순으로 정렬하고,
+    # 더 짧은 검색어(또는 FTS5 를 쓸 수 없는 DB)는 LIKE 조건으로 거른다
+    terms = search.parse_terms(query)
+    if not terms:
+        return []
+
+    use_index = search.is_enabled(db)
+    indexed = [term for term in terms if use_index and len(term) >= search.MIN_INDEXED_TERM_LENGTH]
+    scanned = [term for term in terms if term not in indexed]
+
+    q = db.query(models.Ad)
+    if indexed:
+        q = q.join(search.ads_fts, search.ads_fts.c.rowid == models.Ad.id)\
+            .filter(text("ads_fts MATCH :match"))\
+            .params(match=search.match_expression(indexed))
+    for term in scanned:
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions = []
+        for name, _ in search.SEARCH_COLUMNS:
+            if name in dimensions.FIELDS:
+                model, _ = dimensions.FIELDS[name]
+                conditions.append(dimensions.id_column(name).in_(
+                    select(model.id).where(model.name.ilike(pattern, escape="\\"))
+                ))
+            else:
+                conditions.append(getattr(models.Ad, name).ilike(pattern, escape="\\"))
+        q = q.filter(or_(*conditions))
+
+    if team:
+        q = q.filter(_dimension_filter(db, "team", team))
+    if active is not None:
+        q = q.filter(models.Ad.is_active == active)
+    if start_date:
+        q = q.filter(models.Ad.created_at >= start_date)
+    if end_date:
+        q = q.filter(models.Ad.created_at <= end_date)
+
+    if indexed:
+        q = q.order_by(search.bm25_order(), models.Ad.id)
+    else:
+        q = q.order_by(models.Ad.created_at.desc(), models.Ad.id.desc())
+    return q.offset(skip).limit(limit).all()
+
 def get_ad_history(
     db: Session,
     team: str = None,
     start_date: datetime = None,
     end_date: datetime = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    before: tuple = None
 ):
+    # before=(created_at, id) 가 주어지면 OFFSET 대신 키셋으로 그 다음(더 오래된) 행부터 조회한다
     query = db.query(models.Ad)
     
     if team:
-        query = query.filter(models.Ad.team == team)
+        query = query.filter(_dimension_filter(db, "team", team))
     if start_date:
         query = query.filter(models.Ad.created_at >= start_date)
     if end_date:
         query = query.filter(models.Ad.created_at <= end_date)
         
-    # 날짜 기준 내림차순 정렬
-    query = query.order_by(models.Ad.created_at.desc())
+    # 날짜 기준 내림차순 정렬 (같은 시각이면 id 로 순서를 고정)
+    query = query.order_by(models.Ad.created_at.desc(), models.Ad.id.desc())
+
+    if before is not None:
+        created_at, ad_pk = before
+        query = query.filter(or_(
+            models.Ad.created_at < created_at,
+            and_(models.Ad.created_at == created_at, models.Ad.id < ad_pk)
+        ))
+        return query.limit(limit).all()
     
     return query.offset(skip).limit(limit).all()
 
-def get_team_rejection_stats(db: Session, start_date: datetime = None, end_date: datetime = None):
+def iter_ad_export_rows(
+    db: Session,
+    team: str = None,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    chunk_size: int = 1000
+):
+    # CSV 내보내기용: ORM 객체 대신 필요한 컬럼 튜플만 chunk_size 단위로 읽어온다
+    # 차원 id 는 이름으로 바꿔 (account_name, campaign, adgroup, ad_name, reject_reason, ...) 순서로 돌려준다
     query = db.query(
-        models.Ad.team,
-        func.count(models.Ad.id).label('total_rejections'),
-        func.count(distinct(models.Ad.campaign)).label('affected_campaigns'),
-        func.array_agg(distinct(models.Ad.reject_reason)).label('common_reasons')
-    ).group_by(models.Ad.team)
-    
+        models.Ad.account_id,
+        models.Ad.campaign_id,
+        models.Ad.adgroup_id,
+        models.Ad.ad_name,
+        models.Ad.reject_reason_id,
+        models.Ad.last_modified,
+        models.Ad.planner_comment,
+        models.Ad.executor_comment
+    )
+
+    if team:
+        query = query.filter(_dimension_filter(db, "team", team))
     if start_date:
         query = query.filter(models.Ad.created_at >= start_date)
     if end_date:
         query = query.filter(models.Ad.created_at <= end_date)
-        
-    return query.all()
\ No newline at end of file
+
+    accounts = dimensions.NameLookup(db, "account_name")
+    campaigns = dimensions.NameLookup(db, "campaign")
+    adgroups = dimensions.NameLookup(db, "adgroup")
+    reasons = dimensions.NameLookup(db, "reject_reason")
+    return (
+        (accounts[account_id], campaigns[campaign_id], adgroups[adgroup_id], ad_name, reasons[reject_reason_id],
+         last_modified, planner_comment, executor_comment)
+        for (account_id, campaign_id, adgroup_id, ad_name, reject_reason_id,
+             last_modified, planner_comment, executor_comment)
+        in query.order_by(models.Ad.created_at.desc()).yield_per(chunk_size)
+    )
+
+def rebuild_rejection_rollup(db: Session, commit: bool = True):
+    # ads 테이블 전체로부터 일별 집계를 다시 만든다 (최초 도입, DB 복원 후 등)
+    deltas = Counter()
+    rows = db.query(
+        models.Ad.created_at,
+        models.Ad.team_id,
+        models.Ad.account_id,
+        models.Ad.campaign_id,
+        models.Ad.reject_reason_id
+    ).filter(models.Ad.created_at.isnot(None)).yield_per(1000)
+    for row in _with_names(db, rows):
+        deltas[_rollup_key(row.created_at, row.team, row.account_name, row.campaign, row.reject_reason)] += 1
+
+    try:
+        db.query(models.AdRejectionDaily).delete(synchronize_session=False)
+        _apply_rollup_deltas(db, deltas)
+        if commit:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def ensure_rejection_rollup(db: Session, commit: bool = True):
+    # 집계 테이블이 비어 있는데 광고가 있으면 한 번 채운다
+    if db.query(models.AdRejectionDaily.id).first() is None \
+            and db.query(models.Ad.id).first() is not None:
+        rebuild_rejection_rollup(db, commit=commit)
+
+def get_team_rejection_stats(db: Session, start_date: datetime = None, end_date: datetime = None):
+    # ads 테이블 대신 일별 집계 테이블에서 계산한다 (SQLite/Postgres 공통 쿼리)
+    # 날짜 범위는 일 단위이며 end_date 가 속한 날도 포함한다
+    rollup = models.AdRejectionDaily
+
+    def in_range(query):
+        query = query.filter(rollup.rejections > 0)
+        if start_date:
+            query = query.filter(rollup.day >= start_date.date())
+        if end_date:
+            query = query.filter(rollup.day <= end_date.date())
+        return query
+
+    # 캠페인이 없는(NULL) 광고는 집계 키에서 빈 문자열 캠페인으로 저장되므로 캠페인 수에서 뺀다
+    campaign_id = rollup.campaign_id
+    empty_campaign_id = dimensions.maps["campaign"].id(db, "")
+    if empty_campaign_id is not None:
+        campaign_id = case((rollup.campaign_id != empty_campaign_id, rollup.campaign_id))
+
+    totals = list(_with_names(db, in_range(db.query(
+        rollup.team_id,
+        func.sum(rollup.rejections).label('total_rejections'),
+        func.count(distinct(campaign_id)).label('affected_campaigns')
+    )).group_by(rollup.team_id)))
+
+    reasons = {}
+    reason_rows = _with_names(db, in_range(db.query(
+        rollup.team_id,
+        rollup.reject_reason_id,
+        func.sum(rollup.rejections).label('rejections')
+    )).group_by(rollup.team_id, rollup.reject_reason_id))
+    # 많이 발생한 사유부터 정렬
+    for row in sorted(reason_rows, key=lambda row: (-row.rejections, row.reject_reason)):
+        reasons.setdefault(row.team, []).append(row.reject_reason)
+
+    return [
+        {
+            "team": row.team,
+            "total_rejections": int(row.total_rejections),
+            "affected_campaigns": row.affected_campaigns,
+            "common_reasons": reasons.get(row.team, [])
+        }
+        for row in sorted(totals, key=lambda row: row.team)
+    ]
@@ -1,12 +1,150 @@
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+from .config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_CACHE_SIZE_KIB,
+    SQLITE_MMAP_SIZE,
 )
+
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
+# 쓰기 트랜잭션용 실행 옵션 - BEGIN IMMEDIATE 로 시작해 처음부터 쓰기 잠금을 잡는다
+# (읽기로 시작한 트랜잭션이 쓰기로 바뀔 때는 busy timeout 없이 바로 SQLITE_BUSY 가 난다)
+WRITE_TRANSACTION = {"sqlite_begin": "IMMEDIATE"}
+
+# DB 파일이 통째로 바뀌었을 때(복원) 호출할 함수 - DB 내용을 메모리에 캐시하는 모듈이 등록한다
+on_database_replaced = []
+
+def _database_file_id(path: str):
+    # DB 파일이 교체(복원)되면 inode 가 바뀐다
+    if not path or path == ":memory:":
+        return None
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+def create_sqlite_engine(url: str):
+    # WAL 모드: 읽기는 쓰기 트랜잭션을 기다리지 않고 마지막으로 커밋된 내용을 읽는다
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **POOL_OPTIONS
+    )
+    path = engine.url.database
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        # 드라이버의 암묵적 BEGIN 을 끄고 아래 begin 이벤트에서 직접 보낸다
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS:d}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB:d}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+        connection_record.info["database_file_id"] = _database_file_id(path)
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+    @event.listens_for(engine, "checkout")
+    def _check_database_file(dbapi_connection, connection_record, connection_proxy):
+        # 다른 워커 프로세스가 복원으로 DB 파일을 바꿨다면 이전 파일을 가리키는 커넥션을 버리고 다시 연결한다
+        if connection_record.info.get("database_file_id") != _database_file_id(path):
+            for callback in on_database_replaced:
+                callback()
+            raise DisconnectionError("Database file was replaced")
+
+    return engine
+
+def create_db_engine(url: str):
+    # SQLite 는 파일 하나로 동작하는 기본 설정, 그 외(PostgreSQL)는 커넥션 풀 설정만 적용한다
+    if url.startswith("postgres://"):
+        # Render/Heroku 가 주는 postgres:// 형식은 SQLAlchemy 가 인식하지 못한다
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("sqlite"):
+        return create_sqlite_engine(url)
+    # pre_ping: DB 재시작/유휴 연결 종료 후에도 끊어진 커넥션을 쓰지 않도록 사용 전에 확인한다
+    return create_engine(url, pool_pre_ping=True, **POOL_OPTIONS)
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = engine.dialect.name == "sqlite"
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+class WriteQueue:
+    # 쓰기 작업(동기화 저장, 의견 수정, 변경 로그 정리, 복원)을 전용 스레드 하나에서 차례로 실행한다
+    # 같은 프로세스의 쓰기끼리 SQLite 쓰기 잠금을 두고 경쟁하지 않고, 읽기는 WAL 덕분에 막히지 않는다
+    # 다른 워커 프로세스의 쓰기와는 BEGIN IMMEDIATE + busy timeout 으로 순서가 정해진다
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._local = threading.local()
+
+    def _call(self, fn, args, kwargs):
+        self._local.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._local.active = False
+
+    def run(self, fn, *args, **kwargs):
+        # fn 을 쓰기 스레드에서 실행하고 끝날 때까지 기다려 결과를 돌려준다 (예외도 그대로 전달)
+        # 쓰기 작업 안에서 다시 호출하면 교착되지 않도록 그 자리에서 실행한다
+        if getattr(self._local, "active", False):
+            return fn(*args, **kwargs)
+        return self._executor.submit(self._call, fn, args, kwargs).result()
+
+    def transaction(self, fn, *args, **kwargs):
+        # fn(db, *args, **kwargs) 를 쓰기 트랜잭션 세션으로 실행한다 (커밋은 fn 이 수행)
+        def execute():
+            db = SessionLocal()
+            try:
+                db.connection(execution_options=WRITE_TRANSACTION)
+                return fn(db, *args, **kwargs)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        return self.run(execute)
+
+db_writer = WriteQueue()
+
+def init_db(bind=None):
+    # 테이블/인덱스 생성과 아직 적용되지 않은 스키마 마이그레이션 실행
+    # 앱 DB(bind 없음)는 이어서 비어 있는 일별 집계/검색 색인을 쓰기 트랜잭션에서 채운다
+    # 모델이 등록된 뒤에 실행하도록 여기서 가져온다
+    from app import migrations
+
+    migrations.upgrade(bind if bind is not None else engine)
+    if bind is None:
+        db_writer.transaction(migrations.ensure_derived_data)
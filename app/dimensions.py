@@ -0,0 +1,181 @@
+# dimensions.py
+# 차원 테이블(팀/계정/캠페인/광고 그룹/거절 사유)의 이름 <-> id 메모리 맵
+#
+# 차원 값은 추가만 되고 바뀌거나 지워지지 않으므로 한 번 읽은 매핑은 계속 유효하다.
+# 동기화 중 새로 만든 값은 live_updates 와 같은 방식으로 세션에 쌓아 두었다가 커밋된 뒤에만 맵에 넣는다
+# (롤백된 id 는 다음 INSERT 에서 다른 이름에 다시 쓰일 수 있다). DB 가 통째로 바뀌면(복원) reset() 으로 비운다.
+import threading
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from . import models
+from .database import SessionLocal, on_database_replaced
+
+# Ad 의 이름 필드 -> (차원 모델, 외래 키 컬럼 이름)
+FIELDS = {
+    "team": (models.Team, "team_id"),
+    "account_name": (models.AdAccount, "account_id"),
+    "campaign": (models.Campaign, "campaign_id"),
+    "adgroup": (models.AdGroup, "adgroup_id"),
+    "reject_reason": (models.RejectReason, "reject_reason_id"),
+}
+
+_SESSION_KEY = "pending_dimensions"
+# IN (...) 절 하나에 넣을 최대 파라미터 수 (SQLite 변수 개수 제한 대비)
+LOOKUP_CHUNK_SIZE = 900
+
+def _chunks(items: list):
+    for i in range(0, len(items), LOOKUP_CHUNK_SIZE):
+        yield items[i:i + LOOKUP_CHUNK_SIZE]
+
+def _pending(db: Session, table_name: str) -> dict:
+    # 이 세션의 트랜잭션에서 새로 만든 {이름: id}
+    return db.info.setdefault(_SESSION_KEY, {}).setdefault(table_name, {}) if db is not None else {}
+
+class DimensionMap:
+    def __init__(self, model):
+        self.model = model
+        self.table_name = model.__tablename__
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = {}
+        self._loaded = False
+
+    def _remember(self, pairs):
+        with self._lock:
+            for dimension_id, name in pairs:
+                self._ids[name] = dimension_id
+                self._names[dimension_id] = name
+
+    def reset(self):
+        with self._lock:
+            self._ids.clear()
+            self._names.clear()
+            self._loaded = False
+
+    def _remember_committed(self, db: Session, rows):
+        # 이 세션이 아직 커밋하지 않은 값은 읽혔더라도 맵에 넣지 않는다
+        pending = _pending(db, self.table_name)
+        self._remember((dimension_id, name) for dimension_id, name in rows if name not in pending)
+
+    def _ensure_loaded(self, db: Session):
+        # 작은 테이블이므로 처음 필요할 때 전체를 한 번 읽는다
+        if not self._loaded:
+            self._remember_committed(db, db.execute(select(self.model.id, self.model.name)).all())
+            self._loaded = True
+
+    def _query(self, db: Session, condition):
+        return db.execute(select(self.model.id, self.model.name).where(condition)).all()
+
+    def _with_session(self, db: Session, lookup):
+        if db is not None:
+            return lookup(db)
+        with SessionLocal() as own:
+            return lookup(own)
+
+    def name(self, db: Session, dimension_id: int):
+        if dimension_id is None:
+            return None
+        name = self._names.get(dimension_id)
+        if name is not None:
+            return name
+        for pending_name, pending_id in _pending(db, self.table_name).items():
+            if pending_id == dimension_id:
+                return pending_name
+
+        def lookup(session):
+            self._ensure_loaded(session)
+            if dimension_id not in self._names:
+                # 다른 워커가 나중에 만든 값
+                self._remember_committed(session, self._query(session, self.model.id == dimension_id))
+            return self._names.get(dimension_id)
+        return self._with_session(db, lookup)
+
+    def id(self, db: Session, name: str):
+        # 조회 조건용 - 없는 이름이면 None (만들지 않는다)
+        if name is None:
+            return None
+        dimension_id = self._ids.get(name) or _pending(db, self.table_name).get(name)
+        if dimension_id is not None:
+            return dimension_id
+
+        def lookup(session):
+            self._ensure_loaded(session)
+            if name not in self._ids:
+                self._remember_committed(session, self._query(session, self.model.name == name))
+            return self._ids.get(name)
+        return self._with_session(db, lookup)
+
+    def intern(self, db: Session, names) -> dict:
+        # {이름: id} - 없는 이름은 이 트랜잭션 안에서 만든다 (커밋은 호출자가 수행)
+        pending = _pending(db, self.table_name)
+        result = {}
+        missing = []
+        for name in set(names):
+            if name is None:
+                continue
+            dimension_id = self._ids.get(name) or pending.get(name)
+            if dimension_id is None:
+                missing.append(name)
+            else:
+                result[name] = dimension_id
+        if not missing:
+            return result
+
+        # 다른 워커가 이미 커밋한 값은 바로 맵에 넣는다
+        for chunk in _chunks(missing):
+            self._remember_committed(db, self._query(db, self.model.name.in_(chunk)))
+        created = [name for name in missing if name not in self._ids]
+        if created:
+            table = self.model.__table__
+            insert = postgresql.insert(table) if db.bind.dialect.name == "postgresql" else sqlite.insert(table)
+            db.execute(
+                insert.on_conflict_do_nothing(index_elements=[table.c.name]),
+                [{"name": name} for name in created]
+            )
+            for chunk in _chunks(created):
+                pending.update({
+                    name: dimension_id
+                    for dimension_id, name in self._query(db, self.model.name.in_(chunk))
+                })
+        for name in missing:
+            result[name] = self._ids.get(name) or pending[name]
+        return result
+
+maps = {field: DimensionMap(model) for field, (model, _) in FIELDS.items()}
+_maps_by_table = {dimension_map.table_name: dimension_map for dimension_map in maps.values()}
+
+def id_column(field: str, model=models.Ad):
+    # 외래 키 컬럼 (예: "team" -> Ad.team_id) - 같은 컬럼 이름을 쓰는 로그 테이블(AdChange 등)도 지정할 수 있다
+    return getattr(model, FIELDS[field][1])
+
+def name_of(ad, field: str):
+    return maps[field].name(object_session(ad), getattr(ad, FIELDS[field][1]))
+
+class NameLookup(dict):
+    # {id: 이름} - 처음 보는 id 만 맵에서 찾아 저장한다 (많은 행을 변환할 때 lookup[id] 한 번으로 끝나도록)
+    def __init__(self, db: Session, field: str):
+        super().__init__()
+        self._db = db
+        self._map = maps[field]
+
+    def __missing__(self, dimension_id):
+        name = self[dimension_id] = self._map.name(self._db, dimension_id)
+        return name
+
+def reset():
+    for dimension_map in maps.values():
+        dimension_map.reset()
+
+on_database_replaced.append(reset)
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    for table_name, created in session.info.pop(_SESSION_KEY, {}).items():
+        _maps_by_table[table_name]._remember((dimension_id, name) for name, dimension_id in created.items())
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_SESSION_KEY, None)
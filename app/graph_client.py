@@ -0,0 +1,237 @@
+# graph_client.py
+from contextlib import contextmanager
+import json
+import random
+import threading
+import time
+
+from facebook_business.api import FacebookAdsApi
+from facebook_business.exceptions import FacebookRequestError
+from requests.exceptions import ConnectionError, Timeout
+
+from . import metrics
+from .config import (
+    GRAPH_MAX_RETRIES,
+    GRAPH_RETRY_BASE_DELAY,
+    GRAPH_MAX_RETRY_DELAY,
+    GRAPH_THROTTLE_START_PCT,
+    GRAPH_MAX_REQUEST_INTERVAL,
+    GRAPH_MAX_BLOCK_WAIT,
+)
+
+# 일시적 오류로 보고 재시도하는 Graph API 에러 코드
+# 1/2: 일시적 서버 오류, 4/17/32/341/613: 앱/사용자/페이지 호출 한도, 80000~80014: 비즈니스 사용 사례 한도
+TRANSIENT_ERROR_CODES = {1, 2, 4, 17, 32, 341, 613}
+BUSINESS_USE_CASE_ERROR_CODES = range(80000, 80015)
+
+# 계정 정보 없이 보낸 요청(이름 일괄 조회 등)이 사용하는 키
+GLOBAL_KEY = "*"
+
+class AccountThrottledError(Exception):
+    # 호출 한도로 차단된 시간이 GRAPH_MAX_BLOCK_WAIT 보다 길어 이번 동기화에서는 포기한 계정
+    pass
+
+_context = threading.local()
+
+@contextmanager
+def account_context(account_id: str):
+    # 이 블록 안에서 보내는 요청을 account_id 의 호출 한도로 계산한다
+    previous = getattr(_context, "account_id", None)
+    _context.account_id = account_id
+    try:
+        yield
+    finally:
+        _context.account_id = previous
+
+@contextmanager
+def request_label(call_type: str):
+    # 지표에서 요청 종류를 구분하는 이름 (ads_list, campaign_name, adset_name 등)
+    previous = getattr(_context, "call_type", None)
+    _context.call_type = call_type
+    try:
+        yield
+    finally:
+        _context.call_type = previous
+
+def _call_type(path) -> str:
+    label = getattr(_context, "call_type", None)
+    if label:
+        return label
+    if isinstance(path, str) or not path:
+        return "other"
+    # (노드, 엣지) 형태면 엣지 이름, 노드만 있으면 node
+    return str(path[-1]) if len(path) > 1 else "node"
+
+def _parse_json_header(headers, name: str):
+    value = headers.get(name) if headers else None
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_usage(headers) -> tuple[float, float]:
+    # (최대 사용률 %, 접근 재개까지 남은 시간 초)
+    # x-business-use-case-usage, x-ad-account-usage, x-app-usage 헤더 중 가장 높은 값을 사용한다
+    usage = 0.0
+    regain_seconds = 0.0
+
+    business_usage = _parse_json_header(headers, "x-business-use-case-usage") or {}
+    for entries in business_usage.values():
+        for entry in entries if isinstance(entries, list) else []:
+            usage = max(
+                usage,
+                float(entry.get("call_count") or 0),
+                float(entry.get("total_cputime") or 0),
+                float(entry.get("total_time") or 0)
+            )
+            regain_seconds = max(
+                regain_seconds,
+                float(entry.get("estimated_time_to_regain_access") or 0) * 60
+            )
+
+    account_usage = _parse_json_header(headers, "x-ad-account-usage") or {}
+    usage = max(usage, float(account_usage.get("acc_id_util_pct") or 0))
+    regain_seconds = max(regain_seconds, float(account_usage.get("reset_time_duration") or 0))
+
+    app_usage = _parse_json_header(headers, "x-app-usage") or {}
+    usage = max(
+        usage,
+        float(app_usage.get("call_count") or 0),
+        float(app_usage.get("total_cputime") or 0),
+        float(app_usage.get("total_time") or 0)
+    )
+    return usage, regain_seconds
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    if not isinstance(error, FacebookRequestError):
+        return False
+    code = error.api_error_code()
+    return (
+        error.api_transient_error()
+        or code in TRANSIENT_ERROR_CODES
+        or code in BUSINESS_USE_CASE_ERROR_CODES
+        or (error.http_status() or 0) >= 500
+    )
+
+# 계정별 요청 속도 조절
+# 응답 헤더의 사용률이 GRAPH_THROTTLE_START_PCT 를 넘으면 요청 간격을 제곱 비율로 늘리고,
+# 한도 초과로 차단되면 재개 시각까지 해당 계정의 요청을 멈춘다
+class AccountThrottle:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def _get(self, key: str) -> dict:
+        state = self._state.get(key)
+        if state is None:
+            state = {"usage": 0.0, "interval": 0.0, "next_request_at": 0.0, "blocked_until": 0.0}
+            self._state[key] = state
+        return state
+
+    def wait(self, key: str):
+        # 요청 가능한 시각까지 대기 (같은 계정의 다음 요청 슬롯을 예약한다)
+        with self._lock:
+            state = self._get(key)
+            now = time.monotonic()
+            ready_at = max(state["next_request_at"], state["blocked_until"], now)
+            if ready_at - now > GRAPH_MAX_BLOCK_WAIT:
+                raise AccountThrottledError(
+                    f"Rate limited for {ready_at - now:.0f}s (account {key})"
+                )
+            state["next_request_at"] = ready_at + state["interval"]
+        if ready_at > now:
+            time.sleep(ready_at - now)
+
+    def observe(self, key: str, headers):
+        usage, regain_seconds = parse_usage(headers)
+        with self._lock:
+            state = self._get(key)
+            state["usage"] = usage
+            if usage <= GRAPH_THROTTLE_START_PCT:
+                state["interval"] = 0.0
+            else:
+                ratio = min(1.0, (usage - GRAPH_THROTTLE_START_PCT) / (100 - GRAPH_THROTTLE_START_PCT))
+                state["interval"] = GRAPH_MAX_REQUEST_INTERVAL * ratio * ratio
+            if regain_seconds > 0:
+                state["blocked_until"] = max(state["blocked_until"], time.monotonic() + regain_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                key: {
+                    "usage_pct": state["usage"],
+                    "interval": state["interval"],
+                    "blocked_for": max(0.0, state["blocked_until"] - now)
+                }
+                for key, state in self._state.items()
+            }
+
+# 동기화 실행 간에도 사용률을 기억하도록 모듈 전역으로 둔다
+throttle = AccountThrottle()
+
+def _backoff_delay(attempt: int) -> float:
+    # full jitter 지수 백오프
+    return random.uniform(0, min(GRAPH_MAX_RETRY_DELAY, GRAPH_RETRY_BASE_DELAY * (2 ** attempt)))
+
+class ThrottledFacebookAdsApi(FacebookAdsApi):
+    # FacebookAdsApi.call 을 감싸 모든 SDK 요청(페이지 넘김 포함)에
+    # 계정별 속도 조절, 사용률 헤더 반영, 일시적 오류 재시도를 적용한다
+
+    @classmethod
+    def set_default_api(cls, api_instance):
+        # AdAccount 등 SDK 객체는 FacebookAdsApi 의 기본 인스턴스를 사용하므로 부모 클래스에 등록한다
+        FacebookAdsApi.set_default_api(api_instance)
+
+    def _throttle_key(self, path) -> str:
+        if not isinstance(path, str):
+            for token in path:
+                token = str(token)
+                if token.startswith("act_"):
+                    return token[len("act_"):]
+        return getattr(_context, "account_id", None) or GLOBAL_KEY
+
+    def call(self, method, path, params=None, headers=None, files=None,
+             url_override=None, api_version=None):
+        key = self._throttle_key(path)
+        call_type = _call_type(path)
+        attempt = 0
+        while True:
+            try:
+                throttle.wait(key)
+            except AccountThrottledError:
+                metrics.graph_requests.inc(call=call_type, account=key, outcome="throttled")
+                raise
+            started = time.perf_counter()
+            try:
+                response = super().call(
+                    method, path, params=params, headers=headers, files=files,
+                    url_override=url_override, api_version=api_version
+                )
+            except Exception as e:
+                self._record(call_type, key, started, "error")
+                if isinstance(e, FacebookRequestError):
+                    throttle.observe(key, e.http_headers())
+                if not is_transient(e) or attempt >= GRAPH_MAX_RETRIES:
+                    raise
+                metrics.graph_retries.inc(account=key)
+                delay = _backoff_delay(attempt)
+                attempt += 1
+                print(f"Transient Graph API error (account {key}), retry {attempt} in {delay:.1f}s: {str(e).strip()[:200]}")
+                time.sleep(delay)
+                continue
+
+            self._record(call_type, key, started, "ok")
+            throttle.observe(key, response.headers())
+            return response
+
+    @staticmethod
+    def _record(call_type: str, key: str, started: float, outcome: str):
+        elapsed = time.perf_counter() - started
+        metrics.graph_requests.inc(call=call_type, account=key, outcome=outcome)
+        metrics.graph_request_seconds.inc(elapsed, account=key)
+        metrics.graph_request_duration.observe(elapsed, call=call_type)
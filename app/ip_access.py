@@ -0,0 +1,142 @@
+# ip_access.py
+# 허용 IP 목록 검사 (순수 ASGI 미들웨어)
+import atexit
+import bisect
+import ipaddress
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from collections import OrderedDict
+
+from starlette.responses import JSONResponse
+
+from .config import IP_DECISION_CACHE_SIZE, IP_ACCESS_LOG_SAMPLE_RATE
+
+# 접근 로그는 큐에 넣기만 하고 별도 스레드에서 출력하므로 요청 처리를 막지 않는다
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+access_logger = logging.getLogger("app.ip_access")
+access_logger.setLevel(logging.INFO)
+access_logger.propagate = False
+_log_queue = queue.SimpleQueue()
+_log_listener = None
+
+def _start_log_listener():
+    global _log_listener
+    if _log_listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(_JsonFormatter())
+    access_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    _log_listener = logging.handlers.QueueListener(_log_queue, stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+class IPAllowList:
+    # 허용 네트워크를 IPv4/IPv6 별로 병합·정렬한 구간 [시작, 끝] 목록으로 미리 만들어 두고
+    # 클라이언트 IP는 이진 탐색으로 찾는다. 판정 결과는 IP별로 LRU 캐시한다.
+    def __init__(self, allowed_ips, allowed_ip_ranges, cache_size: int = IP_DECISION_CACHE_SIZE):
+        self.allowed_ips = set(ip.strip() for ip in allowed_ips if ip.strip())
+        networks = []
+        for ip_range in allowed_ip_ranges:
+            if ip_range.strip():
+                try:
+                    networks.append(ipaddress.ip_network(ip_range.strip()))
+                except ValueError as e:
+                    print(f"Invalid IP range format: {ip_range}, error: {e}")
+        self.restricted = bool(self.allowed_ips or networks)
+
+        # {버전: (시작 주소 목록, 끝 주소 목록)}
+        self._intervals = {}
+        for version in (4, 6):
+            merged = ipaddress.collapse_addresses(n for n in networks if n.version == version)
+            starts, ends = [], []
+            for network in merged:
+                starts.append(int(network.network_address))
+                ends.append(int(network.broadcast_address))
+            self._intervals[version] = (starts, ends)
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _in_ranges(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        starts, ends = self._intervals[address.version]
+        value = int(address)
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def is_allowed(self, ip: str) -> bool:
+        if not self.restricted:
+            return True
+        if ip in self.allowed_ips:
+            return True
+
+        allowed = self._cache.get(ip)
+        if allowed is not None:
+            self._cache.move_to_end(ip)
+            return allowed
+
+        allowed = self._in_ranges(ip)
+        self._cache[ip] = allowed
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return allowed
+
+def _client_ip(scope) -> str:
+    # Render의 프록시를 통과한 실제 클라이언트 IP 확인 (x-forwarded-for 의 첫 번째 값)
+    for name, value in scope.get("headers") or ():
+        if name == b"x-forwarded-for":
+            if value:
+                return value.decode("latin-1").split(",")[0].strip()
+            break
+    client = scope.get("client")
+    return client[0] if client else ""
+
+class IPRestrictionMiddleware:
+    def __init__(self, app, allowed_ips=(), allowed_ip_ranges=(), log_sample_rate: float = IP_ACCESS_LOG_SAMPLE_RATE):
+        self.app = app
+        self.allow_list = IPAllowList(allowed_ips, allowed_ip_ranges)
+        # 거부는 항상, 허용은 log_sample_rate 비율만큼만 기록한다
+        self.log_sample_rate = log_sample_rate
+        _start_log_listener()
+
+    async def __call__(self, scope, receive, send):
+        # HTTP 요청만 검사한다 (lifespan/websocket 은 그대로 통과 - 기존 BaseHTTPMiddleware 와 동일)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = _client_ip(scope)
+        if not self.allow_list.is_allowed(client_ip):
+            access_logger.info("access_denied", extra={"fields": {
+                "ip": client_ip, "method": scope.get("method"), "path": scope.get("path")
+            }})
+            response = JSONResponse(
+                status_code=403,
+                content={
+                    "detail": f"Access denied. Your IP ({client_ip}) is not in the allowed list."
+                }
+            )
+            await response(scope, receive, send)
+            return
+
+        if self.log_sample_rate >= 1 or (self.log_sample_rate > 0 and random.random() < self.log_sample_rate):
+            access_logger.info("access_granted", extra={"fields": {
+                "ip": client_ip, "method": scope.get("method"), "path": scope.get("path"),
+                "sample_rate": self.log_sample_rate
+            }})
+        await self.app(scope, receive, send)
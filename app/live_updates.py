@@ -0,0 +1,244 @@
+# live_updates.py
+# 대시보드 실시간 갱신용 변경 피드 (Server-Sent Events)
+#
+# crud 의 쓰기 경로가 남기는 변경 로그(ad_changes)를 구독자가 있는 워커 프로세스마다 LIVE_POLL_SECONDS 간격으로
+# 읽어 보낸다. 그래서 다른 워커 프로세스(스케줄러 리더의 동기화, 다른 워커의 의견 수정)가 저장한 변경도 전달되고,
+# 이벤트 id 가 로그의 seq 이므로 재연결한 클라이언트가 다른 워커에 붙어도 Last-Event-ID 이후부터 이어서 받는다.
+# 로그를 읽는 스레드에서 만든 이벤트는 이벤트 루프를 통해 구독자 큐에 넣는다.
+import asyncio
+from datetime import date, datetime
+import json
+import threading
+import time
+
+from . import crud
+from .config import (
+    LIVE_HISTORY_SIZE,
+    LIVE_QUEUE_SIZE,
+    LIVE_KEEPALIVE_SECONDS,
+    LIVE_MAX_CHANGES_PER_EVENT,
+    LIVE_POLL_SECONDS,
+)
+from .database import SessionLocal, on_database_replaced
+
+# 대시보드 표에 표시되는 광고 필드
+AD_FIELDS = (
+    "ad_id", "team", "account_name", "campaign", "adgroup", "ad_name", "reject_reason",
+    "last_modified", "is_active", "planner_comment", "executor_comment",
+)
+
+# 구독자가 따라오지 못했거나 기록이 사라졌을 때 보내는 이벤트 - 클라이언트는 전체를 다시 조회한다
+RESET = "reset"
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def upsert_change(ad: dict, previous_team: str = None) -> dict:
+    # ad: AD_FIELDS 중 일부 (ad_id, team 은 필수)
+    change = {"op": "upsert", "ad": {key: ad[key] for key in AD_FIELDS if key in ad}}
+    if previous_team and previous_team != ad["team"]:
+        change["previous_team"] = previous_team
+    return change
+
+def deactivate_change(ad_id: str, team: str) -> dict:
+    return {"op": "deactivate", "ad_id": ad_id, "team": team}
+
+def _teams(change: dict) -> tuple:
+    if change["op"] == "deactivate":
+        return (change["team"],)
+    return (change["ad"].get("team"), change.get("previous_team"))
+
+def load_entries(db, rows: list) -> list:
+    # 변경 로그 행 -> [(id, "changes", 변경 목록)] - 광고의 현재 상태로 만든다
+    # 같은 광고가 여러 번 바뀌었으면 마지막 하나만 보낸다 (팀이 바뀐 광고는 이전 팀 행도 남겨 previous_team 으로 보낸다)
+    latest = {}
+    for row in rows:
+        key = (row.ad_id, row.team)
+        latest.pop(key, None)
+        latest[key] = row.seq
+    ads = crud.get_ads_by_ids(db, {ad_id for ad_id, _ in latest})
+
+    changes = []
+    for (ad_id, team), seq in latest.items():
+        ad = ads.get(ad_id)
+        if ad is None or not ad.is_active:
+            changes.append((seq, deactivate_change(ad_id, team)))
+        else:
+            changes.append((seq, upsert_change({key: getattr(ad, key) for key in AD_FIELDS}, previous_team=team)))
+
+    entries = []
+    for i in range(0, len(changes), LIVE_MAX_CHANGES_PER_EVENT):
+        chunk = changes[i:i + LIVE_MAX_CHANGES_PER_EVENT]
+        entries.append((chunk[-1][0], "changes", [change for _, change in chunk]))
+    return entries
+
+class _Subscriber:
+    def __init__(self, loop, team: str = None):
+        self.loop = loop
+        self.team = team
+        self.queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def matches(self, changes: list) -> list:
+        if not self.team:
+            return changes
+        return [change for change in changes if self.team in _teams(change)]
+
+    def offer(self, item):
+        # 이벤트 루프 스레드에서 실행된다
+        # 큐가 가득 찬 느린 구독자는 밀린 이벤트를 버리고 reset 으로 전체 재조회를 요청한다
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, RESET, []))
+
+class ChangeFeed:
+    def __init__(self, poll_seconds: float = LIVE_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        # 구독자에게 보낸 마지막 변경 로그 seq (구독자가 없으면 None - 로그를 읽지 않는다)
+        self._last_seq = None
+        self._subscribers = set()
+        self._active = threading.Event()
+        self._replaced = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _filtered(subscriber: _Subscriber, entry: tuple):
+        # 구독자의 팀에 해당하는 변경만 남긴 항목 (보낼 것이 없으면 None)
+        event_id, name, changes = entry
+        if name == RESET:
+            return entry
+        matched = subscriber.matches(changes)
+        return (event_id, name, matched) if matched else None
+
+    @classmethod
+    def _send(cls, subscriber: _Subscriber, entries: list):
+        # 잠금 안에서 호출해 구독자별 이벤트 순서가 로그 순서와 같게 한다
+        for entry in entries:
+            item = cls._filtered(subscriber, entry)
+            if item is None:
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, item)
+            except RuntimeError:
+                # 이벤트 루프가 이미 닫힘
+                pass
+
+    def publish_reset(self):
+        # 복원처럼 표 전체가 바뀌었을 때 - 다음 로그 확인에서 reset 을 보내고 새 로그의 끝부터 다시 읽는다
+        # (다른 워커가 DB 파일을 바꾼 경우 database.on_database_replaced 로 호출된다)
+        self._replaced.set()
+
+    def _poll(self):
+        with SessionLocal() as db:
+            _, max_seq = crud.get_ad_change_bounds(db)
+            max_seq = max_seq or 0
+            with self._lock:
+                last_seq = self._last_seq
+                if last_seq is None:
+                    return
+                # 복원/로그 교체, 또는 한 번에 보내기엔 너무 많이 밀린 경우(대량 동기화)는 전체 재조회로 대신한다
+                if self._replaced.is_set() or max_seq < last_seq or max_seq - last_seq > LIVE_HISTORY_SIZE:
+                    self._replaced.clear()
+                    self._last_seq = max_seq
+                    for subscriber in self._subscribers:
+                        self._send(subscriber, [(max_seq, RESET, [])])
+                    return
+            if max_seq == last_seq:
+                return
+
+            rows = crud.get_ad_changes(db, last_seq, limit=max_seq - last_seq)
+            entries = load_entries(db, rows) if rows else []
+            with self._lock:
+                # 읽는 동안 구독자가 모두 떠났거나 reset 되었으면 버린다
+                if self._last_seq != last_seq or not rows:
+                    return
+                self._last_seq = rows[-1].seq
+                for subscriber in self._subscribers:
+                    self._send(subscriber, entries)
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Error reading ad change log for live updates: {e}")
+            time.sleep(self.poll_seconds)
+
+    def _subscribe(self, subscriber: _Subscriber, last_event_id: int = None) -> int:
+        # 이벤트 루프 밖(스레드)에서 실행된다. 로그 읽기와 같은 잠금 안에서 등록하고 밀린 변경을 보내
+        # 다시 보낸 변경과 새 변경 사이에 틈이나 중복이 없게 한다. 반환값은 ready 이벤트의 id
+        with self._lock, SessionLocal() as db:
+            min_seq, max_seq = crud.get_ad_change_bounds(db)
+            if self._last_seq is None:
+                self._last_seq = max_seq or 0
+            current = self._last_seq
+            self._subscribers.add(subscriber)
+            self._active.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="live-updates", daemon=True)
+                self._thread.start()
+
+            if last_event_id is None or last_event_id == current:
+                return current
+            # 서버 DB 가 바뀌었거나(복원) 로그가 이미 정리되었거나 너무 많이 밀린 경우
+            if (
+                last_event_id > current
+                or (min_seq is not None and last_event_id + 1 < min_seq)
+                or current - last_event_id > LIVE_HISTORY_SIZE
+            ):
+                self._send(subscriber, [(current, RESET, [])])
+                return min(last_event_id, current)
+            rows = [
+                row for row in crud.get_ad_changes(db, last_event_id, limit=current - last_event_id)
+                if row.seq <= current
+            ]
+            if rows:
+                self._send(subscriber, load_entries(db, rows))
+            return last_event_id
+
+    def _unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._last_seq = None
+                self._active.clear()
+
+    async def stream(self, team: str = None, last_event_id: int = None):
+        # text/event-stream 본문을 만드는 비동기 제너레이터
+        subscriber = _Subscriber(asyncio.get_running_loop(), team)
+        # 다시 보낼 변경이 있으면 그 이전 id 를, 없으면 현재 id 를 기준점으로 알려 준다
+        ready_id = await asyncio.to_thread(self._subscribe, subscriber, last_event_id)
+        try:
+            yield f"retry: 3000\nid: {ready_id}\nevent: ready\ndata: {{}}\n\n"
+            while True:
+                try:
+                    event_id, name, changes = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=LIVE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # 프록시가 유휴 연결을 끊지 않도록 주석 줄을 보낸다
+                    yield ": keep-alive\n\n"
+                    continue
+                data = json.dumps(
+                    {"changes": changes} if name != RESET else {},
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                    default=_json_default
+                )
+                event_id = event_id if event_id is not None else self._last_seq
+                yield f"id: {event_id}\nevent: {name}\ndata: {data}\n\n"
+        finally:
+            self._unsubscribe(subscriber)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+change_feed = ChangeFeed()
+on_database_replaced.append(change_feed.publish_reset)
@@ -1,19 +1,137 @@
 # meta_api.py
-from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.adobjects.campaign import Campaign
 from facebook_business.adobjects.adset import AdSet
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import os
-from .config import AD_ACCOUNTS
+import queue
+import threading
+import time
+from .config import (
+    AD_ACCOUNTS,
+    META_API_MAX_WORKERS,
+    META_API_MAX_CONCURRENT_REQUESTS,
+    META_API_MAX_REQUESTS_PER_ACCOUNT,
+    META_API_PAGE_SIZE,
+    META_NAME_CACHE_TTL,
+    META_NAME_CACHE_SIZE,
+    META_GRAPH_URL,
+    SYNC_MAX_PENDING_PAGES,
+)
+from .graph_client import ThrottledFacebookAdsApi, account_context, request_label
+
+# Graph API의 ?ids= 다중 조회는 한 번에 최대 50개까지 허용된다
+NAME_BATCH_SIZE = 50
+
+# 전체 및 광고 계정별 동시 Graph API 요청 수 제한
+class RequestLimiter:
+    def __init__(self, max_concurrent: int, max_per_account: int):
+        self._global = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._max_per_account = max(1, max_per_account)
+        self._per_account = {}
+        self._lock = threading.Lock()
+
+    def _account_semaphore(self, account_id: str):
+        with self._lock:
+            semaphore = self._per_account.get(account_id)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self._max_per_account)
+                self._per_account[account_id] = semaphore
+            return semaphore
+
+    @contextmanager
+    def slot(self, account_id: str):
+        # 계정 슬롯을 먼저 잡아야 전체 슬롯을 쥔 채로 대기하지 않는다
+        with self._account_semaphore(account_id), self._global:
+            yield
+
+# 캠페인/광고 세트 ID -> 이름 캐시 (TTL + LRU)
+# 모듈 전역 인스턴스를 사용하므로 동기화 실행 간에도 캐시가 유지된다
+class NameResolver:
+    def __init__(self, max_size: int = META_NAME_CACHE_SIZE, ttl: int = META_NAME_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_cached(self, object_id: str):
+        entry = self._cache.get(object_id)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[object_id]
+            return None
+        self._cache.move_to_end(object_id)
+        return name
+
+    def _store(self, names: dict):
+        expires_at = time.monotonic() + self.ttl
+        for object_id, name in names.items():
+            self._cache[object_id] = (name, expires_at)
+            self._cache.move_to_end(object_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def resolve(self, object_ids, loader) -> dict:
+        # loader(ids) 는 최대 NAME_BATCH_SIZE개의 ID를 받아 {id: name}을 반환한다
+        # 조회에 실패한 이름(None)은 캐시하지 않고 다음 동기화 때 다시 조회한다
+        names = {}
+        missing = []
+        with self._lock:
+            for object_id in dict.fromkeys(object_ids):
+                name = self._get_cached(object_id)
+                if name is None:
+                    missing.append(object_id)
+                else:
+                    names[object_id] = name
+
+        for i in range(0, len(missing), NAME_BATCH_SIZE):
+            loaded = loader(missing[i:i + NAME_BATCH_SIZE])
+            with self._lock:
+                self._store({k: v for k, v in loaded.items() if v is not None})
+            names.update(loaded)
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+campaign_names = NameResolver()
+adset_names = NameResolver()
 
 class MetaAdsAPI:
-    def __init__(self):
-        self.api = FacebookAdsApi.init(
+    # stream_accounts 가 내보내는 이벤트 종류
+    PAGE = "page"
+    DONE = "done"
+
+    def __init__(
+        self,
+        max_workers: int = META_API_MAX_WORKERS,
+        max_concurrent_requests: int = META_API_MAX_CONCURRENT_REQUESTS,
+        max_requests_per_account: int = META_API_MAX_REQUESTS_PER_ACCOUNT
+    ):
+        self.api = ThrottledFacebookAdsApi.init(
             access_token=os.getenv('META_ACCESS_TOKEN'),
             app_secret=os.getenv('META_APP_SECRET'),
             app_id=os.getenv('META_APP_ID')
         )
+        if META_GRAPH_URL:
+            self.api._session.GRAPH = META_GRAPH_URL.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.max_requests_per_account = max(1, max_requests_per_account)
+        self.limiter = RequestLimiter(max_concurrent_requests, max_requests_per_account)
+        # 조회에 실패한 광고 계정 ID
+        self.failed_accounts = set()
+
+    @contextmanager
+    def _account_requests(self, account_id: str):
+        # 동시 요청 수 제한 + 해당 계정의 호출 한도로 계산
+        with self.limiter.slot(account_id), account_context(account_id):
+            yield
 
     def get_account_name(self, account_id: str) -> tuple[str, str]:
         for team, accounts in AD_ACCOUNTS.items():
@@ -26,9 +144,10 @@ class MetaAdsAPI:
         try:        
             campaign = Campaign(campaign_id)
 
-            campaign_info = campaign.api_get(
-                fields=['name']
-            )
+            with request_label('campaign_name'):
+                campaign_info = campaign.api_get(
+                    fields=['name']
+                )
 
             return campaign_info['name']
 
@@ -40,9 +159,10 @@ class MetaAdsAPI:
         try:
             adset = AdSet(adset_id)
 
-            adset_info = adset.api_get(
-                fields=['name']
-            )
+            with request_label('adset_name'):
+                adset_info = adset.api_get(
+                    fields=['name']
+                )
 
             return adset_info['name']
 
@@ -50,12 +170,63 @@ class MetaAdsAPI:
             print(f"Error fetching adset name: {str(e)}")
             return None
 
-    def get_rejected_ads_for_team(self, team_name: str, accounts: dict):
-        rejected_ads = []
-        for account_name, account_id in accounts.items():
-            account = AdAccount(f'act_{account_id}')
-            try:
-                ads = account.get_ads(
+    def _load_names(self, object_ids: list[str], fallback, label: str) -> dict:
+        # 여러 ID의 이름을 한 번의 요청(GET /?ids=...&fields=name)으로 조회
+        # 요청 전체가 실패하면(삭제된 ID가 섞인 경우 등) 개별 조회로 대체한다
+        try:
+            with request_label(label):
+                response = self.api.call(
+                    'GET',
+                    (),
+                    params={'ids': ','.join(object_ids), 'fields': 'name'}
+                ).json()
+            return {
+                object_id: response.get(object_id, {}).get('name')
+                for object_id in object_ids
+            }
+        except Exception as e:
+            print(f"Error fetching names in batch: {str(e)}")
+            return {object_id: fallback(object_id) for object_id in object_ids}
+
+    def resolve_names(self, account_id: str, campaign_ids: list[str], adset_ids: list[str]):
+        def load(resolver, object_ids, fallback, label):
+            def loader(chunk):
+                with self._account_requests(account_id):
+                    return self._load_names(chunk, fallback, label)
+            return resolver.resolve(object_ids, loader)
+
+        campaign_args = (campaign_names, campaign_ids, self.get_campaign_name, 'campaign_names')
+        adset_args = (adset_names, adset_ids, self.get_adset_name, 'adset_names')
+        if self.max_requests_per_account > 1:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                campaigns = executor.submit(load, *campaign_args)
+                adsets = executor.submit(load, *adset_args)
+                return campaigns.result(), adsets.result()
+
+        return load(*campaign_args), load(*adset_args)
+
+    def iter_rejected_ad_pages(
+        self,
+        team_name: str,
+        account_name: str,
+        account_id: str,
+        updated_since: datetime = None
+    ):
+        # 광고 목록을 Graph API 페이지 단위로 받아 변환한 광고 목록을 하나씩 내보낸다 (계정 전체를 메모리에 모으지 않음)
+        # updated_since 가 주어지면 그 이후 수정된 광고만 상태와 무관하게 조회한다(증분 동기화).
+        # 이때 더 이상 DISAPPROVED 가 아닌 광고는 is_active=False 로 반환되어 비활성화 대상이 된다.
+        # 조회 중 오류가 나면 failed_accounts 에 기록하고 멈춘다 (이미 내보낸 페이지는 그대로 유효하다)
+        account = AdAccount(f'act_{account_id}')
+        if updated_since is None:
+            params = {'effective_status': ['DISAPPROVED']}
+        else:
+            params = {'updated_since': int(updated_since.replace(tzinfo=timezone.utc).timestamp())}
+        params['limit'] = META_API_PAGE_SIZE
+        try:
+            # 요청 슬롯은 페이지를 받는 동안만 잡는다 (이름 조회와 저장 대기 중에는 다른 계정이 쓸 수 있게)
+            # get_ads 는 첫 페이지를 받아 온 커서를 돌려주고, 이후 페이지는 load_next_page 로 받는다
+            with self._account_requests(account_id), request_label('ads_list'):
+                cursor = account.get_ads(
                     fields=[
                         'id',
                         'name',
@@ -65,42 +236,110 @@ class MetaAdsAPI:
                         'updated_time',
                         'ad_review_feedback'
                     ],
-                    params={'effective_status': ['DISAPPROVED']}
+                    params=params
                 )
-                
-                for ad in ads:
-                    campaign_name = self.get_campaign_name(ad['campaign_id'])
-                    adset_name = self.get_adset_name(ad['adset_id'])
-
-                    reject_reason = "Unknown"
-                    if 'ad_review_feedback' in ad:
-                        feedback = ad['ad_review_feedback'].get('global', {})
-                        if feedback:
-                            reject_reason = list(feedback.keys())[0]
-
-                    rejected_ads.append({
-                        'team': team_name,
-                        'campaign': campaign_name,
-                        'adgroup': adset_name,
-                        'ad_id': ad['id'],
-                        'ad_name': ad['name'],
-                        'account_name': account_name,
-                        'reject_reason': reject_reason,
-                        'last_modified': datetime.strptime(
-                            ad['updated_time'], 
-                            '%Y-%m-%dT%H:%M:%S%z'
-                        ),
-                        'is_active': True
-                    })
+            while len(cursor):
+                # 큐에 남은 광고만 꺼낸다 (비어 있을 때의 next() 처럼 다음 페이지를 요청하지 않는다)
+                ads = [next(cursor) for _ in range(len(cursor))]
+                yield self._convert_ads(team_name, account_name, account_id, ads)
+                with self._account_requests(account_id), request_label('ads_list'):
+                    if not cursor.load_next_page():
+                        break
+
+        except Exception as e:
+            print(f"Error fetching ads for account {account_id}: {str(e)}")
+            self.failed_accounts.add(account_id)
+
+    def _convert_ads(self, team_name: str, account_name: str, account_id: str, ads: list) -> list:
+        rejected_ads = []
+        disapproved = [ad for ad in ads if ad.get('effective_status') == 'DISAPPROVED']
+
+        # 광고마다 이름을 조회하지 않고, 중복을 제거한 ID를 캐시/일괄 조회로 해석한다
+        campaign_name_map, adset_name_map = self.resolve_names(
+            account_id,
+            [ad['campaign_id'] for ad in disapproved],
+            [ad['adset_id'] for ad in disapproved]
+        )
 
+        for ad in ads:
+            last_modified = datetime.strptime(
+                ad['updated_time'], 
+                '%Y-%m-%dT%H:%M:%S%z'
+            )
+            if ad.get('effective_status') != 'DISAPPROVED':
+                rejected_ads.append({
+                    'ad_id': ad['id'],
+                    'account_id': account_id,
+                    'last_modified': last_modified,
+                    'is_active': False
+                })
+                continue
+
+            reject_reason = "Unknown"
+            if 'ad_review_feedback' in ad:
+                feedback = ad['ad_review_feedback'].get('global', {})
+                if feedback:
+                    reject_reason = list(feedback.keys())[0]
+
+            rejected_ads.append({
+                'team': team_name,
+                'campaign': campaign_name_map.get(ad['campaign_id']),
+                'adgroup': adset_name_map.get(ad['adset_id']),
+                'ad_id': ad['id'],
+                'ad_name': ad['name'],
+                'account_id': account_id,
+                'account_name': account_name,
+                'reject_reason': reject_reason,
+                'last_modified': last_modified,
+                'is_active': True
+            })
+        return rejected_ads
+
+    def stream_accounts(self, targets: list[tuple], max_pending_pages: int = SYNC_MAX_PENDING_PAGES):
+        # targets: (team_name, account_name, account_id[, updated_since]) 목록
+        # 계정들을 작업 풀에서 동시에 조회하면서 받은 순서대로 내보낸다:
+        #   (PAGE, target, ads)   - 계정의 광고 한 페이지 (변환 완료)
+        #   (DONE, target, failed) - 계정 조회 끝 (failed: 중간에 실패했는지)
+        # 대기열이 max_pending_pages 만큼 차면 수집 스레드는 소비자가 가져갈 때까지 기다린다
+        if not targets:
+            return
+        events = queue.Queue(maxsize=max(1, max_pending_pages))
+        stopped = threading.Event()
+
+        def put(event) -> bool:
+            # 소비자가 중간에 멈추면(예외) 수집 스레드가 대기열 앞에서 영원히 기다리지 않게 한다
+            while not stopped.is_set():
+                try:
+                    events.put(event, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(target):
+            account_id = target[2]
+            try:
+                for ads in self.iter_rejected_ad_pages(*target):
+                    if not put((self.PAGE, target, ads)):
+                        return
             except Exception as e:
                 print(f"Error fetching ads for account {account_id}: {str(e)}")
-                
-        return rejected_ads
+                self.failed_accounts.add(account_id)
+            put((self.DONE, target, account_id in self.failed_accounts))
 
-    def get_all_rejected_ads(self):
-        all_rejected_ads = []
-        for team_name, accounts in AD_ACCOUNTS.items():
-            team_ads = self.get_rejected_ads_for_team(team_name, accounts)
-            all_rejected_ads.extend(team_ads)
-        return all_rejected_ads
\ No newline at end of file
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(targets)),
+            thread_name_prefix="ads-fetch"
+        )
+        try:
+            for target in targets:
+                executor.submit(fetch, target)
+            remaining = len(targets)
+            while remaining:
+                event = events.get()
+                if event[0] == self.DONE:
+                    remaining -= 1
+                yield event
+        finally:
+            stopped.set()
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,245 @@
+# metrics.py
+# Prometheus 텍스트 형식 지표 (/metrics)
+#
+# 외부 의존성 없이 카운터/게이지/히스토그램만 구현한다. 기록은 지표별 잠금 아래에서
+# dict 조회와 정수 증가 몇 번으로 끝나므로 요청당 비용이 작다.
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 히스토그램 버킷 상한(초)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+GRAPH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        # function: 수집 시점에 값을 계산하는 함수 (레이블 없는 게이지)
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        if self._function is not None:
+            items = [((), self._function())]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [버킷별 개수(누적 아님) + 초과분, 합계]
+                state = [[0] * (len(self.buckets) + 1), 0.0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self._header()
+        for key, counts, total in items:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(upper)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def render() -> bytes:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+# HTTP
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status"), REQUEST_BUCKETS
+)
+
+# Graph API
+graph_requests = Counter(
+    "graph_api_requests_total", "Graph API requests by call type, ad account and outcome",
+    ("call", "account", "outcome")
+)
+graph_request_seconds = Counter(
+    "graph_api_request_seconds_total", "Total Graph API request time by ad account", ("account",)
+)
+graph_request_duration = Histogram(
+    "graph_api_request_duration_seconds", "Graph API request latency by call type",
+    ("call",), GRAPH_BUCKETS
+)
+graph_retries = Counter(
+    "graph_api_retries_total", "Graph API retries after transient errors", ("account",)
+)
+
+# 동기화
+sync_duration = Histogram(
+    "sync_duration_seconds", "Ad sync duration by mode and outcome", ("mode", "outcome"), JOB_BUCKETS
+)
+sync_rows = Counter("sync_rows_total", "Ads inserted/updated/deactivated by sync", ("result",))
+sync_failed_accounts = Gauge("sync_failed_accounts", "Ad accounts that failed in the last sync")
+sync_last_success = Gauge("sync_last_success_timestamp_seconds", "Unix time of the last successful sync")
+
+# DB
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by statement type",
+    ("operation",), QUERY_BUCKETS
+)
+
+# 백업
+backup_duration = Histogram(
+    "backup_duration_seconds", "Backup duration by kind and outcome", ("kind", "outcome"), JOB_BUCKETS
+)
+backup_size = Gauge("backup_size_bytes", "Size of the most recent backup file by kind", ("kind",))
+backup_last_success = Gauge("backup_last_success_timestamp_seconds", "Unix time of the last successful backup")
+
+# SQLAlchemy 이벤트로 모든 엔진의 쿼리 시간을 잰다
+_QUERY_START_KEY = "metrics_query_start"
+_OPERATIONS = {"select", "insert", "update", "delete", "pragma", "create", "with"}
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip()[:7].split(None, 1)
+    word = word[0].lower() if word else ""
+    if word == "with":
+        return "select"
+    return word if word in _OPERATIONS else "other"
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get(_QUERY_START_KEY)
+    if started:
+        db_query_duration.observe(time.perf_counter() - started.pop(), operation=_operation(statement))
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get(_QUERY_START_KEY) if context.connection is not None else None
+    if started:
+        started.pop()
+
+class MetricsMiddleware:
+    # 라우트 템플릿(/ads/{ad_id}/comments 등) 기준 지연 시간 히스토그램
+    # SSE 처럼 연결이 계속 열려 있는 응답은 제외한다
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        response = {"status": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        response["streaming"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not response["streaming"]:
+                route = scope.get("route")
+                http_request_duration.observe(
+                    time.perf_counter() - started,
+                    method=scope.get("method", ""),
+                    route=getattr(route, "path", "unmatched"),
+                    status=response["status"]
+                )
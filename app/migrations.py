@@ -0,0 +1,153 @@
+# migrations.py
+# 스키마 마이그레이션
+#
+# 새 테이블/인덱스는 모델에 정의하면 upgrade() 의 create_all 단계가 만들어 준다.
+# 기존 테이블의 컬럼 변경, 데이터 변환, DB 종류별 객체(확장, 특수 인덱스)처럼 create_all 로 할 수 없는 변경만
+# MIGRATIONS 에 버전 순서대로 추가한다. 적용한 버전은 schema_migrations 테이블에 기록된다.
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from .database import Base, WRITE_TRANSACTION
+from . import crud, dimensions, models, search
+
+# 여러 워커가 동시에 시작해도 한 프로세스만 마이그레이션을 실행하도록 잡는 advisory lock 키
+PG_MIGRATION_LOCK_KEY = 7320114
+
+# LIKE 검색(search_ads)이 PostgreSQL 에서 전체 스캔하지 않도록 trigram GIN 인덱스를 만드는 (테이블, 컬럼)
+# 팀은 검색 대상이 아니므로 제외
+PG_TRGM_COLUMNS = [("ads", "ad_name")] + [
+    (model.__tablename__, "name") for field, (model, _) in dimensions.FIELDS.items() if field != "team"
+]
+
+def _pg_trigram_indexes(conn: Connection):
+    if conn.dialect.name != "postgresql":
+        return
+    try:
+        # 확장을 만들 권한이 없으면 인덱스 없이 진행한다 (검색은 느리지만 동작한다)
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        print(f"Skipping trigram indexes, pg_trgm is not available: {e}")
+        return
+    for table, column in PG_TRGM_COLUMNS:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)"
+        ))
+
+# 차원 테이블로 옮기기 전 ads 의 문자열 컬럼에 걸려 있던 인덱스
+_LEGACY_AD_INDEXES = (
+    "ix_ads_team", "ix_ads_campaign", "ix_ads_adgroup", "ix_ads_account_name",
+    "ix_ads_team_active_id", "ix_ads_team_created_at_id",
+    "ix_ads_campaign_trgm", "ix_ads_adgroup_trgm", "ix_ads_account_name_trgm", "ix_ads_reject_reason_trgm",
+)
+
+def _names_to_dimension_ids(conn: Connection, table: str, fields):
+    # table 의 이름 컬럼(fields)을 차원 테이블 외래 키 컬럼으로 바꾼다
+    # 컬럼을 추가해 채운 뒤 문자열 컬럼을 지운다 (SQLite 3.35+ DROP COLUMN, 지울 컬럼의 인덱스는 먼저 지울 것)
+    for field in fields:
+        model, id_column = dimensions.FIELDS[field]
+        dimension = model.__tablename__
+        conn.execute(text(
+            f"INSERT INTO {dimension} (name) SELECT DISTINCT {field} FROM {table} "
+            f"WHERE {field} IS NOT NULL AND {field} NOT IN (SELECT name FROM {dimension})"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {id_column} INTEGER REFERENCES {dimension} (id)"))
+        conn.execute(text(
+            f"UPDATE {table} SET {id_column} = "
+            f"(SELECT id FROM {dimension} WHERE {dimension}.name = {table}.{field})"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {field}"))
+
+def _ads_dimension_tables(conn: Connection):
+    # 이전 스키마(ads 에 team/campaign/... 문자열)를 차원 테이블 + 외래 키로 바꾼다 (테이블은 다시 만들지 않는다)
+    columns = {column["name"] for column in inspect(conn).get_columns("ads")}
+    if "team" not in columns:
+        return
+    for name in _LEGACY_AD_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    _names_to_dimension_ids(conn, "ads", dimensions.FIELDS)
+
+    # 일별 집계는 이름 대신 id 로 다시 만든다 (시작 시 ensure_rejection_rollup 이 ads 로부터 채운다)
+    conn.execute(text("DROP TABLE IF EXISTS ad_rejection_daily"))
+    models.AdRejectionDaily.__table__.create(bind=conn)
+    # PostgreSQL 의 trigram 인덱스를 차원 테이블에 다시 만든다 (migration 2 가 이미 적용된 DB)
+    _pg_trigram_indexes(conn)
+
+# 추가만 하는 로그 테이블의 문자열 컬럼 -> 차원 id (migration 5)
+# 이름 컬럼에 걸린 인덱스는 지운 뒤 upgrade() 마지막 단계에서 id 컬럼으로 다시 만든다
+_LOG_DIMENSION_FIELDS = {
+    "ad_rejection_events": (
+        ("team", "account_name", "reject_reason"),
+        ("ix_ad_rejection_events_team_time", "ix_ad_rejection_events_account_time"),
+    ),
+    "ad_changes": (("team",), ("ix_ad_changes_team_seq",)),
+}
+
+def _log_dimension_ids(conn: Connection):
+    for table, (fields, indexes) in _LOG_DIMENSION_FIELDS.items():
+        columns = {column["name"] for column in inspect(conn).get_columns(table)}
+        if "team" not in columns:
+            continue
+        for name in indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        _names_to_dimension_ids(conn, table, fields)
+
+def _sync_run_columns(conn: Connection):
+    # 스트리밍 동기화의 확인 시각/이어서 실행할 기준 컬럼 (새 DB 는 create_all 이 이미 만들었다)
+    for column in (models.Ad.__table__.c.last_seen_at, models.SyncCheckpoint.__table__.c.last_run_id):
+        table = column.table.name
+        if column.name not in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}"))
+
+# (버전, 설명, 함수(conn))
+MIGRATIONS = [
+    (1, "sqlite fts5 table for ad search", search.create_search_table),
+    (2, "postgresql trigram indexes for ad search", _pg_trigram_indexes),
+    (3, "dimension tables for ad team/account/campaign/adgroup/reject reason", _ads_dimension_tables),
+    (4, "ads.last_seen_at and sync_checkpoints.last_run_id for resumable sync", _sync_run_columns),
+    (5, "dimension ids for ad_rejection_events and ad_changes", _log_dimension_ids),
+]
+
+def _lock(conn: Connection):
+    # SQLite 는 WRITE_TRANSACTION(BEGIN IMMEDIATE)으로 이미 쓰기 잠금을 잡은 상태다
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_MIGRATION_LOCK_KEY})
+
+def upgrade(engine: Engine):
+    # 하나의 트랜잭션에서 실행되어 중간에 실패하면 아무것도 적용되지 않는다
+    table = models.SchemaMigration.__table__
+    with engine.connect().execution_options(**WRITE_TRANSACTION) as conn, conn.begin():
+        _lock(conn)
+        Base.metadata.create_all(bind=conn)
+
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+        for version, description, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            migrate(conn)
+            conn.execute(table.insert(), {
+                "version": version,
+                "description": description,
+                "applied_at": datetime.utcnow()
+            })
+            print(f"Applied schema migration {version}: {description}")
+
+        # create_all 은 이미 존재하는 테이블에 새로 정의한 인덱스를 추가하지 않는다
+        # (마이그레이션이 컬럼을 바꾼 뒤에 만들어야 하므로 마지막에 실행)
+        for model_table in Base.metadata.sorted_tables:
+            for index in model_table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+def ensure_derived_data(db: Session):
+    # ads 로부터 만드는 일별 집계와 검색 색인이 비어 있거나 어긋났으면 채운다 (시작/복원 시 마이그레이션 다음에 실행)
+    # db_writer.transaction 으로 실행해 쓰기 잠금을 먼저 잡고 확인하므로 여러 워커가 동시에 시작해도
+    # 한 프로세스만 채우고 나머지는 채워진 결과를 보고 건너뛴다 (PostgreSQL 은 마이그레이션 advisory lock 을 함께 쓴다)
+    _lock(db.connection())
+    crud.ensure_rejection_rollup(db, commit=False)
+    search.ensure_search_index(db, commit=False)
+    db.commit()
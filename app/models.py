@@ -1,21 +1,180 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, ForeignKey, Integer, String, Date, DateTime, Boolean, Text, Index, UniqueConstraint
 from app.database import Base
 from datetime import datetime
 
+# 광고마다 반복되던 문자열(팀/계정/캠페인/광고 그룹/거절 사유)은 차원 테이블에 한 번만 저장하고
+# ads 와 집계 테이블은 정수 id 로 참조한다. 이름 <-> id 변환은 app/dimensions.py 의 메모리 맵이 맡는다.
+class _Dimension:
+    id = Column(Integer, primary_key=True)
+    name = Column(Text, nullable=False, unique=True)
+
+class Team(_Dimension, Base):
+    __tablename__ = "teams"
+
+class AdAccount(_Dimension, Base):
+    __tablename__ = "ad_accounts"
+
+class Campaign(_Dimension, Base):
+    __tablename__ = "campaigns"
+
+class AdGroup(_Dimension, Base):
+    __tablename__ = "adgroups"
+
+class RejectReason(_Dimension, Base):
+    __tablename__ = "reject_reasons"
+
+class _DimensionName:
+    # ad.team 처럼 이름으로 읽을 수 있게 하는 속성 (API/CSV 응답 형태 유지)
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        from app import dimensions
+        return dimensions.name_of(instance, self.field)
+
 class Ad(Base):
     __tablename__ = "ads"
 
     id = Column(Integer, primary_key=True, index=True)
-    team = Column(String, index=True)
-    campaign = Column(String, index=True)
-    adgroup = Column(String, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"))
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), index=True)
+    adgroup_id = Column(Integer, ForeignKey("adgroups.id"), index=True)
     ad_id = Column(String, unique=True, index=True)
     ad_name = Column(String, index=True)
-    account_name = Column(String, index=True)
-    reject_reason = Column(Text)
+    account_id = Column(Integer, ForeignKey("ad_accounts.id"), index=True)
+    reject_reason_id = Column(Integer, ForeignKey("reject_reasons.id"))
     last_modified = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     planner_comment = Column(Text, nullable=True)  # 기획팀 의견
-    executor_comment = Column(Text, nullable=True)  # 집행팀 의견
\ No newline at end of file
+    executor_comment = Column(Text, nullable=True)  # 집행팀 의견
+    # 동기화에서 마지막으로 받은 시각 - 전체 동기화가 끝난 뒤 이보다 오래된 광고를 비활성화한다
+    last_seen_at = Column(DateTime, nullable=True)
+
+    team = _DimensionName("team")
+    campaign = _DimensionName("campaign")
+    adgroup = _DimensionName("adgroup")
+    account_name = _DimensionName("account_name")
+    reject_reason = _DimensionName("reject_reason")
+
+    __table_args__ = (
+        # 커서 페이지네이션용 복합 인덱스
+        Index("ix_ads_team_active_id", "team_id", "is_active", "id"),  # /ads/
+        Index("ix_ads_created_at_id", "created_at", "id"),  # /ads/history
+        Index("ix_ads_team_created_at_id", "team_id", "created_at", "id"),  # /ads/history?team=
+    )
+
+class SyncCheckpoint(Base):
+    # 광고 계정별 증분 동기화 기준점
+    __tablename__ = "sync_checkpoints"
+
+    account_id = Column(String, primary_key=True)
+    team = Column(String)
+    account_name = Column(String)
+    last_updated_time = Column(DateTime, nullable=True)  # 지금까지 확인한 가장 최근 updated_time (UTC)
+    last_full_sync = Column(DateTime, nullable=True)  # 마지막 전체 동기화 시각 (UTC)
+    last_synced_at = Column(DateTime, nullable=True)  # 마지막으로 조회에 성공한 시각 (UTC)
+    last_run_id = Column(Integer, nullable=True)  # 저장까지 끝낸 마지막 동기화 실행 (sync_runs.id)
+
+
+class SyncRun(Base):
+    # 동기화 실행 - 중간에 프로세스가 죽으면 finished_at 이 비어 있는 채로 남고,
+    # 다음 동기화는 last_run_id 가 이 실행인 계정을 건너뛰고 나머지 계정부터 이어서 실행한다
+    __tablename__ = "sync_runs"
+
+    RUNNING = "running"
+    FINISHED = "finished"
+    ABANDONED = "abandoned"  # 이어서 실행하지 않고 새 실행을 시작함
+
+    id = Column(Integer, primary_key=True)
+    full = Column(Boolean, nullable=False)
+    status = Column(String(16), nullable=False, default=RUNNING)
+    started_at = Column(DateTime, nullable=False)  # 이 시각 이후에 받은 광고가 이번 실행에서 확인된 광고
+    finished_at = Column(DateTime, nullable=True)
+
+
+class AdRejectionDaily(Base):
+    # 팀 리젝 통계용 일별 집계 (광고가 처음 수집된 날짜 기준)
+    # 동기화 경로(crud)가 광고를 저장할 때 함께 갱신한다
+    __tablename__ = "ad_rejection_daily"
+
+    # 이름이 없는 값(NULL)은 유니크 제약에서 서로 다른 값으로 취급되므로 빈 문자열의 id 로 저장한다
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("ad_accounts.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)  # 기간 내 캠페인 수(distinct) 계산용
+    reject_reason_id = Column(Integer, ForeignKey("reject_reasons.id"), nullable=False)
+    rejections = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "team_id", "account_id", "campaign_id", "reject_reason_id",
+            name="uq_ad_rejection_daily_key"
+        ),
+    )
+
+
+class AdRejectionEvent(Base):
+    # 광고 리젝 상태 변화 이력 (추가만 하고 수정하지 않는다)
+    __tablename__ = "ad_rejection_events"
+
+    REJECTED = "rejected"  # 처음 리젝된 광고
+    REJECTED_AGAIN = "rejected_again"  # 리젝이 풀렸다가 다시 리젝된 광고
+    REASON_CHANGED = "reason_changed"  # 리젝 상태에서 거절 사유만 바뀐 광고
+    CLEARED = "cleared"  # 더 이상 리젝 상태가 아닌 광고 (승인/재활성화/삭제)
+
+    id = Column(Integer, primary_key=True)
+    ad_id = Column(String, nullable=False)
+    event_type = Column(String(16), nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"))
+    account_id = Column(Integer, ForeignKey("ad_accounts.id"))
+    reject_reason_id = Column(Integer, ForeignKey("reject_reasons.id"))
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    team = _DimensionName("team")
+    account_name = _DimensionName("account_name")
+    reject_reason = _DimensionName("reject_reason")
+
+    __table_args__ = (
+        # 팀/계정별 기간 조회가 테이블을 읽지 않고 인덱스 범위 스캔으로 끝나도록 구성
+        Index("ix_ad_rejection_events_team_time", "team_id", "occurred_at", "event_type", "ad_id"),
+        Index("ix_ad_rejection_events_account_time", "account_id", "occurred_at", "event_type", "ad_id"),
+        Index("ix_ad_rejection_events_ad_time", "ad_id", "occurred_at"),
+    )
+
+
+class AdChange(Base):
+    # 광고 변경 로그 - /ads/changes 가 seq 이후의 변경만 돌려줄 수 있도록 crud 쓰기 경로가 기록한다
+    # seq 는 재사용되지 않도록 AUTOINCREMENT 로 만든다 (오래된 로그를 지워도 단조 증가)
+    __tablename__ = "ad_changes"
+
+    INSERT = "insert"  # 새로 수집된 광고
+    UPDATE = "update"  # 표시 필드나 의견이 바뀐 광고
+    DEACTIVATE = "deactivate"  # 비활성화된 광고
+
+    seq = Column(Integer, primary_key=True)
+    ad_id = Column(String, nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"))
+    op = Column(String(16), nullable=False)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    team = _DimensionName("team")
+
+    __table_args__ = (
+        Index("ix_ad_changes_team_seq", "team_id", "seq"),
+        Index("ix_ad_changes_changed_at", "changed_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class SchemaMigration(Base):
+    # 적용된 스키마 마이그레이션 버전 (app/migrations.py)
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.utcnow)
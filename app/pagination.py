@@ -0,0 +1,25 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime
+
+# 커서는 마지막으로 반환한 행의 정렬 키를 담은 불투명 문자열이다
+# 클라이언트는 next_cursor 값을 그대로 다음 요청의 cursor 로 넘기기만 하면 된다
+
+def encode_cursor(*values) -> str:
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
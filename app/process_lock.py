@@ -0,0 +1,164 @@
+# process_lock.py
+# 같은 서버에서 실행되는 여러 워커 프로세스 사이의 잠금 (uvicorn --workers N)
+#
+# flock 은 프로세스가 죽으면 운영체제가 바로 풀어 주므로 잠금이 남아 있는 문제가 없다.
+# 스케줄 작업은 LeaderElection 으로 잠금을 잡은 한 프로세스에서만 실행하고,
+# 동기화/백업/복원은 FileLock 으로 프로세스 사이에서도 한 번에 하나만 실행한다.
+# 워커 사이에 공유해야 하는 작은 상태(동기화 작업 목록)는 SharedState 로 잠금 디렉터리의 JSON 파일에 둔다.
+from contextlib import contextmanager
+from copy import deepcopy
+import json
+import os
+import tempfile
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # flock 이 없는 환경(Windows)에서는 프로세스 안의 잠금만 사용한다 - 단일 워커로 실행할 것
+    fcntl = None
+
+from .config import LOCK_DIR
+
+def lock_path(name: str) -> str:
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    return os.path.join(LOCK_DIR, name)
+
+class FileLock:
+    # flock 은 열린 파일 단위로 걸리므로 같은 프로세스의 다른 스레드는 threading.Lock 으로 막는다
+    def __init__(self, name: str):
+        self.name = name
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking=blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            lock_file = open(lock_path(self.name), "a+b")
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                lock_file.close()
+                self._thread_lock.release()
+                return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class LeaderElection:
+    # 잠금을 기다리는 데몬 스레드가 잠금을 얻는 순간 on_elected 를 호출한다
+    # 리더 프로세스가 죽으면 기다리던 워커 중 하나가 곧바로 이어받는다
+    def __init__(self, name: str, on_elected, on_resigned=None):
+        self.lock = FileLock(name)
+        self.on_elected = on_elected
+        self.on_resigned = on_resigned
+        self.is_leader = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._campaign, name=f"leader-{self.lock.name}", daemon=True)
+        self._thread.start()
+
+    def _campaign(self):
+        self.lock.acquire()
+        self.is_leader = True
+        print(f"Process {os.getpid()} elected leader for {self.lock.name}")
+        try:
+            self.on_elected()
+        except Exception:
+            self.resign()
+            raise
+
+    def resign(self):
+        # 종료 시 잠금을 바로 풀어 다른 워커가 기다리지 않고 이어받게 한다
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            if self.on_resigned is not None:
+                self.on_resigned()
+        finally:
+            self.lock.release()
+
+class SharedState:
+    # 잠금 디렉터리의 JSON 파일 하나 - 읽기는 잠금 없이, 수정은 파일 잠금 안에서 읽고 고친 뒤 원자적으로 바꿔 쓴다
+    def __init__(self, name: str, default: dict):
+        self.name = name
+        self.default = default
+        self.lock = FileLock(f"{name}.lock")
+
+    def read(self) -> dict:
+        try:
+            with open(lock_path(self.name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # 아직 없거나 손상된 파일
+            return deepcopy(self.default)
+
+    @contextmanager
+    def update(self):
+        with self.lock:
+            state = self.read()
+            yield state
+            fd, temp_path = tempfile.mkstemp(dir=LOCK_DIR, prefix=f".{self.name}.")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(temp_path, lock_path(self.name))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+# 이 프로세스를 가리키는 토큰 - 프로세스가 살아 있는 동안 worker-<토큰>.lock 을 잡고 있는다
+_worker_token = None
+_worker_lock = None
+_worker_token_lock = threading.Lock()
+
+def worker_token() -> str:
+    global _worker_token, _worker_lock
+    with _worker_token_lock:
+        if _worker_token is None:
+            token = uuid.uuid4().hex
+            lock = FileLock(f"worker-{token}.lock")
+            lock.acquire()
+            _worker_token, _worker_lock = token, lock
+        return _worker_token
+
+def is_worker_alive(token: str) -> bool:
+    # 다른 워커의 토큰 잠금을 잡을 수 있으면 그 프로세스는 이미 종료된 것이다
+    if token == _worker_token:
+        return True
+    if fcntl is None:
+        # 단일 워커로만 실행되므로 다른 토큰은 이전 실행의 것이다
+        return False
+    lock = FileLock(f"worker-{token}.lock")
+    if not lock.acquire(blocking=False):
+        return True
+    try:
+        os.unlink(lock_path(lock.name))
+    except OSError:
+        pass
+    lock.release()
+    return False
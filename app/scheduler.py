@@ -1,43 +1,410 @@
 # scheduler.py
 from apscheduler.schedulers.background import BackgroundScheduler
-from . import crud, schemas, backup
+from . import crud, schemas, backup, metrics
 from .meta_api import MetaAdsAPI
-from .database import SessionLocal
+from .database import SessionLocal, db_writer, IS_SQLITE
+from .cache import bump_data_version
+from .process_lock import FileLock, LeaderElection, SharedState, worker_token, is_worker_alive
+from .config import (
+    AD_ACCOUNTS,
+    SYNC_FULL_RECONCILE_HOURS,
+    SYNC_WRITE_BATCH_SIZE,
+    SYNC_MAX_PENDING_PAGES,
+    SYNC_RESUME_MAX_AGE_HOURS,
+    AD_CHANGE_LOG_RETENTION_DAYS,
+)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+import time
+import uuid
 import pytz
+from pydantic import ValidationError
 
-def fetch_and_store_ads():
-    meta_api = MetaAdsAPI()
-    rejected_ads = meta_api.get_all_rejected_ads()
-    
-    db = SessionLocal()
+# 증분 조회 시 체크포인트보다 조금 앞에서부터 다시 조회해 경계에 걸린 광고를 놓치지 않는다
+CHECKPOINT_OVERLAP = timedelta(minutes=5)
+
+def _to_utc_naive(value: datetime):
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _full_sync_accounts(checkpoints: dict, now: datetime) -> set:
+    # 체크포인트가 없거나 마지막 전체 동기화가 오래된 계정만 전체 조회하고 나머지는 증분 조회한다
+    # (조회에 계속 실패해 체크포인트가 없는 계정이 있어도 다른 계정은 증분 동기화를 유지한다)
+    deadline = now - timedelta(hours=SYNC_FULL_RECONCILE_HOURS)
+    full_accounts = set()
+    for accounts in AD_ACCOUNTS.values():
+        for account_id in accounts.values():
+            checkpoint = checkpoints.get(account_id)
+            if checkpoint is None or checkpoint.last_full_sync is None or checkpoint.last_full_sync < deadline:
+                full_accounts.add(account_id)
+    return full_accounts
+
+def _updated_since(checkpoints: dict, full_accounts: set) -> dict:
+    updated_since = {}
+    for account_id, checkpoint in checkpoints.items():
+        if account_id in full_accounts:
+            continue
+        # 한 번도 거절 광고를 본 적 없는 계정은 마지막 조회 시각을 기준으로 삼는다
+        since = checkpoint.last_updated_time or checkpoint.last_synced_at
+        if since is not None:
+            updated_since[account_id] = since - CHECKPOINT_OVERLAP
+    return updated_since
+
+class _AccountBatch:
+    # 한 계정에서 받았지만 아직 저장하지 않은 광고 (SYNC_WRITE_BATCH_SIZE 를 넘기 전에 저장한다)
+    def __init__(self):
+        self.ads = []
+        self.cleared_ad_ids = []
+        self.latest_updated = None
+        self.received = 0
+        self.invalid = 0
+
+    def __len__(self):
+        return len(self.ads) + len(self.cleared_ad_ids)
+
+    def add(self, fetched_ads: list):
+        # 검증 단계: schemas.AdCreate 로 바꿀 수 없는 광고(이름 조회 실패 등)는 건너뛰고 계정을 실패로 표시한다
+        for ad_data in fetched_ads:
+            self.received += 1
+            updated_time = _to_utc_naive(ad_data['last_modified'])
+            if self.latest_updated is None or updated_time > self.latest_updated:
+                self.latest_updated = updated_time
+
+            if not ad_data['is_active']:
+                self.cleared_ad_ids.append(ad_data['ad_id'])
+                continue
+            try:
+                self.ads.append(schemas.AdCreate(**ad_data))
+            except ValidationError as e:
+                self.invalid += 1
+                print(f"Skipping invalid ad {ad_data.get('ad_id')}: {e.errors()[0]['msg']}")
+
+    def take(self):
+        ads, cleared_ad_ids = self.ads, self.cleared_ad_ids
+        self.ads, self.cleared_ad_ids = [], []
+        return ads, cleared_ad_ids
+
+def _store_account_batch(db, ads: list, cleared_ad_ids: list, checkpoint: dict = None):
+    # 쓰기 스레드(db_writer)에서 실행된다 - 변환/검증은 호출 전에 끝내 쓰기 잠금을 잡는 시간을 줄인다
+    # checkpoint 가 주어지면(계정의 마지막 묶음) 같은 트랜잭션에서 계정 체크포인트를 옮겨
+    # 중단 후 다시 실행할 때 이 계정을 건너뛸 수 있게 한다
+    # 이번에 보이지 않은 광고의 비활성화는 모든 계정이 끝난 뒤 _finish_run 에서 한 번만 한다
+    result = crud.bulk_upsert_ads(db, ads, deactivate_missing=False, commit=False)
+    result["deactivated"] = crud.deactivate_ads(db, cleared_ad_ids, commit=False)
+    if checkpoint is not None:
+        crud.save_sync_checkpoint(db, **checkpoint)
+    db.commit()
+    bump_data_version()
+    return result
+
+def _finish_run(db, run_id: int, started_at: datetime):
+    # 이번 실행에서 전체 조회를 끝낸 계정만 받지 못한 광고를 비활성화한다
+    # 증분 조회한 계정과 끝내지 못한 계정(조회 실패)의 광고는 보이지 않았더라도 비활성화하지 않는다
+    # (전체 조회를 끝낸 계정은 같은 트랜잭션에서 last_full_sync 가 이번 실행의 started_at 으로 저장된다)
+    completed = crud.get_completed_sync_accounts(db, run_id)
+    checkpoints = crud.get_sync_checkpoints(db)
+    skipped_account_names = [
+        account_name
+        for accounts in AD_ACCOUNTS.values()
+        for account_name, account_id in accounts.items()
+        if account_id not in completed or checkpoints[account_id].last_full_sync != started_at
+    ]
+    deactivated = 0
+    if len(skipped_account_names) < sum(len(accounts) for accounts in AD_ACCOUNTS.values()):
+        deactivated = crud.deactivate_unseen_ads(
+            db, started_at, commit=False, skip_account_names=skipped_account_names
+        )
+    crud.finish_sync_run(db, run_id)
+    db.commit()
+    bump_data_version()
+    return deactivated
+
+def _plan_run(full: bool, now: datetime):
+    # (run_id, 전체 조회할 계정, started_at, 건너뛸 계정, updated_since) - 중단된 실행이 있으면 이어서 실행한다
+    # full=True 이면 모든 계정, False 이면 어느 계정도 전체 조회로 기록하지 않는다
+    with SessionLocal() as db:
+        checkpoints = crud.get_sync_checkpoints(db)
+        run = crud.get_resumable_sync_run(db)
+        resumable = (
+            run is not None
+            and run.started_at >= now - timedelta(hours=SYNC_RESUME_MAX_AGE_HOURS)
+            # 전체 동기화 요청은 중단된 증분 동기화를 이어받지 않는다
+            and not (full and not run.full)
+        )
+        if resumable:
+            # 남은 계정의 체크포인트는 중단 전과 같으므로 같은 계정이 다시 전체 조회 대상이 된다
+            run_id, started_at = run.id, run.started_at
+            full = True if run.full else full
+            completed = crud.get_completed_sync_accounts(db, run_id)
+        else:
+            run_id, started_at, completed = None, now, set()
+
+        all_accounts = {account_id for accounts in AD_ACCOUNTS.values() for account_id in accounts.values()}
+        if full is None:
+            full_accounts = _full_sync_accounts(checkpoints, started_at)
+        else:
+            full_accounts = all_accounts if full else set()
+        updated_since = _updated_since(checkpoints, full_accounts)
+
+    if run_id is None:
+        # sync_runs.full: 모든 계정을 전체 조회하는 실행 (중단되면 전체 동기화 요청이 이어받을 수 있다)
+        run_id = db_writer.transaction(crud.start_sync_run, full_accounts == all_accounts, started_at)
+    return run_id, full_accounts, started_at, completed, updated_since
+
+def fetch_and_store_ads(full: bool = None, progress=None):
+    # full=None 이면 체크포인트 상태에 따라 전체/증분 동기화를 자동으로 선택한다
+    # progress(team_name, account_name, account_id, ad_count, failed, resumed=False): 계정 저장이 끝날 때마다 호출
+    #
+    # Graph API 페이지 -> 검증 -> 계정별 묶음 저장 순서로 흘려 보내므로 메모리에는 대기열(SYNC_MAX_PENDING_PAGES 페이지)과
+    # 동시에 조회 중인 계정의 묶음(SYNC_WRITE_BATCH_SIZE)만 남는다. 계정이 끝날 때마다 체크포인트를 커밋하므로
+    # 프로세스가 중간에 죽어도 다음 실행은 끝난 계정을 건너뛰고 이어서 진행한다.
+    timer = time.perf_counter()
     try:
-        current_ad_ids = []
-        for ad_data in rejected_ads:
-            current_ad_ids.append(ad_data['ad_id'])
-            ad = schemas.AdCreate(**ad_data)
-            crud.create_or_update_ad(db=db, ad=ad)
-        
-        crud.deactivate_old_ads(db, current_ad_ids)
-    finally:
-        db.close()
+        # Graph API 조회 동안 읽기 트랜잭션을 열어 두지 않도록 체크포인트만 읽고 세션을 닫는다
+        run_id, full_accounts, started_at, completed, updated_since = _plan_run(full, datetime.utcnow())
 
-def init_scheduler():
+        targets = []
+        for team_name, accounts in AD_ACCOUNTS.items():
+            for account_name, account_id in accounts.items():
+                if account_id in completed:
+                    if progress:
+                        progress(team_name, account_name, account_id, 0, False, resumed=True)
+                    continue
+                targets.append((team_name, account_name, account_id, updated_since.get(account_id)))
+
+        result = {"inserted": 0, "updated": 0, "deactivated": 0}
+
+        def store(batch: _AccountBatch, checkpoint: dict = None):
+            ads, cleared_ad_ids = batch.take()
+            stored = db_writer.transaction(_store_account_batch, ads, cleared_ad_ids, checkpoint)
+            for key in result:
+                result[key] += stored[key]
+
+        meta_api = MetaAdsAPI()
+        batches = {}
+        with closing(meta_api.stream_accounts(targets, SYNC_MAX_PENDING_PAGES)) as events:
+            for kind, target, payload in events:
+                team_name, account_name, account_id, _ = target
+                batch = batches.setdefault(account_id, _AccountBatch())
+                if kind == MetaAdsAPI.PAGE:
+                    batch.add(payload)
+                    if len(batch) >= SYNC_WRITE_BATCH_SIZE:
+                        store(batch)
+                    continue
+
+                # 계정 조회 끝 - 남은 묶음을 저장하고, 모두 받았으면 체크포인트를 옮긴다
+                # 조회에 실패한 계정은 기준점을 옮기지 않아 다음 실행에서 다시 조회된다
+                failed = payload or batch.invalid > 0
+                if failed:
+                    meta_api.failed_accounts.add(account_id)
+                store(batch, None if failed else {
+                    "account_id": account_id,
+                    "team": team_name,
+                    "account_name": account_name,
+                    "synced_at": started_at,
+                    "last_updated_time": batch.latest_updated,
+                    "full": account_id in full_accounts,
+                    "run_id": run_id,
+                })
+                del batches[account_id]
+                if progress:
+                    progress(team_name, account_name, account_id, batch.received, failed)
+
+        result["deactivated"] += db_writer.transaction(_finish_run, run_id, started_at)
+        # 일부 계정만 전체 조회했으면 mixed
+        fetched_full = {target[2] for target in targets} & full_accounts
+        if fetched_full and len(fetched_full) == len(targets):
+            result["mode"] = "full"
+        else:
+            result["mode"] = "mixed" if fetched_full else "incremental"
+        result["full_accounts"] = len(fetched_full)
+        result["failed_accounts"] = sorted(meta_api.failed_accounts)
+        result["resumed_accounts"] = len(completed)
+
+        metrics.sync_duration.observe(time.perf_counter() - timer, mode=result["mode"], outcome="ok")
+        for key in ("inserted", "updated", "deactivated"):
+            metrics.sync_rows.inc(result[key], result=key)
+        metrics.sync_failed_accounts.set(len(meta_api.failed_accounts))
+        metrics.sync_last_success.set(time.time())
+        return result
+    except Exception:
+        mode = "unknown" if full is None else ("full" if full else "incremental")
+        metrics.sync_duration.observe(time.perf_counter() - timer, mode=mode, outcome="error")
+        raise
+
+# 광고 동기화 작업 관리
+# 동기화는 전용 작업 스레드 하나에서만 실행되며, 실행 중에 들어온 요청(수동 새로고침,
+# 매시 30분 스케줄)은 새 작업을 만들지 않고 진행 중인 작업에 합쳐진다
+# 작업 상태는 SharedState 파일에 두어 어느 워커 프로세스에 들어온 요청이든 같은 작업을 보고 합친다
+class SyncJobManager:
+    MAX_HISTORY = 20
+
+    def __init__(self):
+        self._state = SharedState("sync_jobs.json", {"current": None, "jobs": {}})
+        # 다른 워커 프로세스의 동기화와도 겹치지 않도록 실행 전에 잡는 잠금
+        self._process_lock = FileLock("sync.lock")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ads-sync")
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.utcnow().isoformat()
+
+    @classmethod
+    def _reap(cls, job: dict) -> bool:
+        # 작업을 맡은 워커 프로세스가 끝나기 전에 종료되었으면 실패로 표시한다
+        if job["status"] not in ("queued", "running") or is_worker_alive(job["worker"]):
+            return False
+        job["status"] = "failed"
+        job["error"] = "Worker process exited before the sync finished"
+        job["finished_at"] = cls._now()
+        return True
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        return {key: value for key, value in job.items() if key != "worker"}
+
+    def submit(self, trigger: str, full: bool = None):
+        # (작업 상태, 새로 만들었는지 여부)
+        with self._state.update() as state:
+            current = state["jobs"].get(state["current"])
+            if current is not None and not self._reap(current) and current["status"] in ("queued", "running"):
+                current["merged_triggers"].append(trigger)
+                return self._public(current), False
+
+            total_accounts = sum(len(accounts) for accounts in AD_ACCOUNTS.values())
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "trigger": trigger,
+                "merged_triggers": [],
+                "status": "queued",
+                "created_at": self._now(),
+                "started_at": None,
+                "finished_at": None,
+                "progress": {
+                    "total_accounts": total_accounts,
+                    "completed_accounts": 0,
+                    "failed_accounts": [],
+                    "accounts": {}
+                },
+                "result": None,
+                "error": None,
+                "worker": worker_token()
+            }
+            state["current"] = job["job_id"]
+            state["jobs"][job["job_id"]] = job
+            # dict 는 추가 순서를 유지하므로 앞에서부터 오래된 작업이다
+            for job_id in list(state["jobs"])[:-self.MAX_HISTORY]:
+                del state["jobs"][job_id]
+            self._executor.submit(self._run, job["job_id"], full)
+            return self._public(job), True
+
+    def get(self, job_id: str):
+        job = self._state.read()["jobs"].get(job_id)
+        if job is None:
+            return None
+        self._reap(job)
+        return self._public(job)
+
+    def latest(self):
+        state = self._state.read()
+        return self.get(state["current"]) if state["current"] else None
+
+    def _update_job(self, job_id: str, update):
+        with self._state.update() as state:
+            job = state["jobs"].get(job_id)
+            if job is not None:
+                update(job)
+
+    def _on_account_done(self, job_id, team_name, account_name, account_id, ad_count, failed, resumed=False):
+        def update(job):
+            progress = job["progress"]
+            progress["completed_accounts"] += 1
+            progress["accounts"][account_id] = {
+                "team": team_name,
+                "account_name": account_name,
+                # resumed: 중단된 이전 실행에서 이미 저장을 끝낸 계정
+                "status": "failed" if failed else ("resumed" if resumed else "done"),
+                "ads": ad_count
+            }
+            if failed:
+                progress["failed_accounts"].append(account_id)
+        self._update_job(job_id, update)
+
+    def _run(self, job_id, full):
+        # 다른 워커가 동기화 중이면 끝날 때까지 queued 상태로 기다린다
+        self._process_lock.acquire()
+        self._update_job(job_id, lambda job: job.update(status="running", started_at=self._now()))
+        try:
+            result = fetch_and_store_ads(
+                full=full,
+                progress=lambda *args, **kwargs: self._on_account_done(job_id, *args, **kwargs)
+            )
+            self._update_job(job_id, lambda job: job.update(status="succeeded", result=result))
+        except Exception as e:
+            print(f"Error syncing ads: {str(e)}")
+            error = str(e)
+            self._update_job(job_id, lambda job: job.update(status="failed", error=error))
+        finally:
+            self._process_lock.release()
+            self._update_job(job_id, lambda job: job.update(finished_at=self._now()))
+
+sync_jobs = SyncJobManager()
+
+def run_scheduled_sync():
+    sync_jobs.submit("scheduler")
+
+def prune_change_log():
+    before = datetime.utcnow() - timedelta(days=AD_CHANGE_LOG_RETENTION_DAYS)
+    deleted = db_writer.transaction(crud.prune_ad_changes, before)
+    print(f"Pruned {deleted} ad change log entries older than {before:%Y-%m-%d}")
+
+_scheduler = None
+
+def _start_scheduler():
+    global _scheduler
     scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Seoul'))
     
     # 기존 광고 데이터 수집 작업
     scheduler.add_job(
-        fetch_and_store_ads, 
+        run_scheduled_sync, 
         'cron',
         hour='*',
         minute=30
     )
     
-    # DB 백업 작업 (매일 자정에 실행)
+    # DB 백업 작업 (매일 자정에 실행, SQLite 파일일 때만)
+    if IS_SQLITE:
+        scheduler.add_job(
+            backup.backup_database,
+            'cron',
+            hour=0,
+            minute=0
+        )
+
+    # 오래된 변경 로그 정리 (매일 00:10)
     scheduler.add_job(
-        backup.backup_database,
+        prune_change_log,
         'cron',
         hour=0,
-        minute=0
+        minute=10
     )
     
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
+    _scheduler = scheduler
+
+def _stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+
+# uvicorn --workers N 으로 여러 프로세스가 떠 있어도 잠금을 잡은 리더 하나만 스케줄 작업을 실행한다
+scheduler_election = LeaderElection("scheduler.lock", _start_scheduler, _stop_scheduler)
+
+def init_scheduler():
+    scheduler_election.start()
+
+def shutdown_scheduler():
+    scheduler_election.resign()
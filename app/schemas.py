@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class AdBase(BaseModel):
     account_name: str
@@ -30,4 +30,34 @@ class Ad(AdBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AdPage(BaseModel):
+    items: List[Ad]
+    next_cursor: Optional[str] = None
+
+
+class AdRejectionEvent(BaseModel):
+    id: int
+    ad_id: str
+    event_type: str
+    team: Optional[str] = None
+    account_name: Optional[str] = None
+    reject_reason: Optional[str] = None
+    occurred_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AdChange(BaseModel):
+    seq: int
+    op: str  # insert / update / deactivate
+    ad_id: str
+    team: Optional[str] = None
+    ad: Optional[Ad] = None  # deactivate 일 때는 없음
+
+class AdChangePage(BaseModel):
+    changes: List[AdChange]
+    next_cursor: str
+    has_more: bool = False
@@ -0,0 +1,113 @@
+# search.py
+# 광고 전문 검색 인덱스 (SQLite FTS5)
+#
+# ads_fts 의 rowid 는 ads.id 와 같다. 테이블은 스키마 마이그레이션이 만들고, 트리거 대신 crud 쓰기 경로가
+# index_ads() 로 갱신하며, 시작/복원 시 ensure_search_index() 가 행 수를 비교해 어긋났으면 다시 만든다.
+# trigram 토크나이저를 사용하므로 한국어도 단어 일부(3글자 이상)로 찾을 수 있다.
+from sqlalchemy import Column, Integer, MetaData, Table, Text, text
+from sqlalchemy.orm import Session
+
+from . import dimensions, models
+
+# (컬럼, bm25 가중치) - 광고 이름/캠페인에서 찾은 결과를 위로
+SEARCH_COLUMNS = (
+    ("ad_name", 10.0),
+    ("campaign", 5.0),
+    ("adgroup", 3.0),
+    ("account_name", 2.0),
+    ("reject_reason", 4.0),
+    ("planner_comment", 2.0),
+    ("executor_comment", 2.0),
+)
+# trigram 인덱스로 찾을 수 있는 최소 글자 수 (더 짧은 검색어는 LIKE 로 거른다)
+MIN_INDEXED_TERM_LENGTH = 3
+INDEX_CHUNK_SIZE = 900
+
+# create_all 에 포함되지 않도록 별도 MetaData 에 정의한 조회용 테이블
+ads_fts = Table(
+    "ads_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    *[Column(name, Text) for name, _ in SEARCH_COLUMNS]
+)
+
+_COLUMN_LIST = ", ".join(name for name, _ in SEARCH_COLUMNS)
+
+def _source_query() -> str:
+    # 색인할 값 - 차원 id 컬럼은 차원 테이블과 조인해 이름으로 넣는다
+    columns = []
+    joins = []
+    for name, _ in SEARCH_COLUMNS:
+        if name in dimensions.FIELDS:
+            model, id_column = dimensions.FIELDS[name]
+            columns.append(f"{model.__tablename__}.name")
+            joins.append(f" LEFT JOIN {model.__tablename__} ON {model.__tablename__}.id = ads.{id_column}")
+        else:
+            columns.append(f"ads.{name}")
+    return f"SELECT ads.id, {', '.join(columns)} FROM ads{''.join(joins)}"
+
+_SOURCE_QUERY = _source_query()
+
+def _is_sqlite(db: Session) -> bool:
+    return db.bind.dialect.name == "sqlite"
+
+def is_enabled(db: Session) -> bool:
+    # FTS5 는 SQLite 전용 - 다른 DB 에서는 LIKE 검색만 사용한다
+    # 색인 테이블이 아직 없는 DB(마이그레이션 전, create_all 만 한 DB)에서도 색인 없이 동작한다
+    # (다음 ensure_search_index 에서 행 수가 어긋난 것을 보고 다시 만든다)
+    if not _is_sqlite(db):
+        return False
+    return db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ads_fts'")).first() is not None
+
+def bm25_order():
+    weights = ", ".join(str(weight) for _, weight in SEARCH_COLUMNS)
+    return text(f"bm25(ads_fts, {weights})")
+
+def parse_terms(query: str) -> list[str]:
+    # 공백으로 나눈 검색어 (모두 포함해야 일치)
+    return list(dict.fromkeys(term for term in (query or "").split() if term))
+
+def match_expression(terms: list[str]) -> str:
+    # 각 검색어를 FTS5 구문 문자열로 감싸 연산자/특수문자를 그대로 검색한다
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def create_search_table(conn):
+    # 스키마 마이그레이션(app/migrations.py)과 ensure_search_index 에서 사용
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5({_COLUMN_LIST}, tokenize='trigram')"
+    ))
+
+def ensure_search_index(db: Session, commit: bool = True):
+    if not _is_sqlite(db):
+        return
+    create_search_table(db.connection())
+    indexed = db.execute(text("SELECT count(*) FROM ads_fts")).scalar()
+    total = db.query(models.Ad.id).count()
+    if indexed != total:
+        rebuild_search_index(db, commit=False)
+    if commit:
+        db.commit()
+
+def rebuild_search_index(db: Session, commit: bool = True):
+    db.execute(text("DELETE FROM ads_fts"))
+    db.execute(text(f"INSERT INTO ads_fts (rowid, {_COLUMN_LIST}) {_SOURCE_QUERY}"))
+    if commit:
+        db.commit()
+
+def index_ads(db: Session, ad_ids: list[str]):
+    # 지정한 광고의 현재 값으로 색인을 교체한다 (커밋은 호출자가 데이터와 함께 수행)
+    if not ad_ids or not is_enabled(db):
+        return
+    ad_ids = list(ad_ids)
+    for i in range(0, len(ad_ids), INDEX_CHUNK_SIZE):
+        params = {f"id{n}": ad_id for n, ad_id in enumerate(ad_ids[i:i + INDEX_CHUNK_SIZE])}
+        placeholders = ", ".join(f":{name}" for name in params)
+        db.execute(text(
+            f"DELETE FROM ads_fts WHERE rowid IN (SELECT id FROM ads WHERE ad_id IN ({placeholders}))"
+        ), params)
+        db.execute(text(
+            f"INSERT INTO ads_fts (rowid, {_COLUMN_LIST}) "
+            f"{_SOURCE_QUERY} WHERE ads.ad_id IN ({placeholders})"
+        ), params)
@@ -0,0 +1,79 @@
+# bench_bulk_upsert.py
+# 동기화 저장 경로 비교: crud.create_or_update_ad 반복 vs crud.bulk_upsert_ads
+#
+# 실행: python -m benchmarks.bench_bulk_upsert --ads 3000
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, dimensions, schemas
+
+def make_ads(count: int, revision: int = 0):
+    base_time = datetime(2025, 1, 1)
+    return [
+        schemas.AdCreate(
+            team=f"team{i % 6}",
+            campaign=f"campaign_{i % 40}",
+            adgroup=f"adset_{i % 200}",
+            ad_id=str(120000000000000000 + i),
+            ad_name=f"ad_{i}_r{revision}",
+            account_name=f"account_{i % 50}",
+            reject_reason="허용되지 않는 비즈니스 관행",
+            last_modified=base_time + timedelta(minutes=i),
+            is_active=True
+        )
+        for i in range(count)
+    ]
+
+def new_session(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    database.init_db(engine)
+    # 실행마다 새 DB 이므로 이전 DB 의 차원 id 를 버린다
+    dimensions.reset()
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+def per_row(db, ads):
+    for ad in ads:
+        crud.create_or_update_ad(db=db, ad=ad)
+    crud.deactivate_old_ads(db, [ad.ad_id for ad in ads])
+
+def bulk(db, ads):
+    crud.bulk_upsert_ads(db, ads)
+
+def run(name: str, store, count: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db = new_session(os.path.join(tmp, "bench.db"))
+        try:
+            timings = []
+            # 첫 실행은 신규 삽입, 두 번째 실행은 기존 광고 갱신
+            for revision in range(2):
+                ads = make_ads(count, revision)
+                started = time.perf_counter()
+                store(db, ads)
+                timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+            engine.dispose()
+    print(f"{name:<10} insert {timings[0]:8.3f}s   update {timings[1]:8.3f}s")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and bulk ad persistence")
+    parser.add_argument("--ads", type=int, default=3000)
+    args = parser.parse_args()
+
+    print(f"ads per sync: {args.ads}")
+    row_timings = run("per-row", per_row, args.ads)
+    bulk_timings = run("bulk", bulk, args.ads)
+    print(
+        f"speedup    insert {row_timings[0] / bulk_timings[0]:7.1f}x   "
+        f"update {row_timings[1] / bulk_timings[1]:7.1f}x"
+    )
+
+if __name__ == "__main__":
+    main()
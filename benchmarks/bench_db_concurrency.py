@@ -0,0 +1,158 @@
+# bench_db_concurrency.py
+# SQLite 동시 읽기/쓰기 부하 벤치마크
+#
+# 대시보드 조회(읽기 스레드), 의견 수정(쓰기 스레드), 주기적인 동기화 저장(bulk upsert)을 동시에 실행하고
+# 기존 설정(rollback 저널, 스레드마다 직접 쓰기)과 현재 설정(WAL + pragma + db_writer 쓰기 큐)을 비교한다.
+#
+# 실행: python -m benchmarks.bench_db_concurrency --ads 20000 --readers 8 --writers 2 --duration 10
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from app import crud, database, dimensions, schemas, search
+
+TEAMS = [f"team{n}" for n in range(6)]
+BASE_TIME = datetime(2024, 1, 1)
+
+def make_ad(index: int, reason: str = "policy") -> schemas.AdCreate:
+    return schemas.AdCreate(
+        account_name=f"bench_account_{index % 50}",
+        team=TEAMS[index % len(TEAMS)],
+        campaign=f"campaign_{index % 400}",
+        adgroup=f"adgroup_{index % 2000}",
+        ad_id=f"bench{index:09d}",
+        ad_name=f"ad_{index}",
+        reject_reason=reason,
+        last_modified=BASE_TIME + timedelta(minutes=index)
+    )
+
+def setup_engine(mode: str, path: str):
+    url = f"sqlite:///{path}"
+    if mode == "legacy":
+        # 변경 전 app/database.py 와 같은 설정
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+    else:
+        engine = database.create_sqlite_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+    # 모드마다 새 DB 이므로 이전 DB 의 차원 id 를 버린다
+    dimensions.reset()
+    return engine
+
+def populate(ad_count: int):
+    with database.SessionLocal() as db:
+        search.ensure_search_index(db)
+        crud.bulk_upsert_ads(db, [make_ad(n) for n in range(ad_count)], deactivate_missing=False)
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def timed(self, fn):
+        started = time.perf_counter()
+        try:
+            fn()
+        except OperationalError:
+            # database is locked 등
+            with self._lock:
+                self.errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+
+    def summary(self, duration: float) -> str:
+        values = sorted(self.latencies)
+        if not values:
+            return f"{0:9.1f} {'-':>8} {'-':>8} {'-':>8} {self.errors:7d}"
+
+        def pct(p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+        return f"{len(values) / duration:9.1f} {pct(0.5):8.2f} {pct(0.95):8.2f} {pct(0.99):8.2f} {self.errors:7d}"
+
+def run_mode(mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = setup_engine(mode, os.path.join(tmp, "bench.db"))
+        populate(args.ads)
+
+        stop = threading.Event()
+        reads, comments, syncs = Recorder(), Recorder(), Recorder()
+
+        def write(fn, *fn_args, **fn_kwargs):
+            # legacy: 호출한 스레드에서 바로 쓰기 / wal: 쓰기 큐를 거친다
+            if mode == "legacy":
+                with database.SessionLocal() as db:
+                    return fn(db, *fn_args, **fn_kwargs)
+            return database.db_writer.transaction(fn, *fn_args, **fn_kwargs)
+
+        def reader():
+            rng = random.Random()
+            while not stop.is_set():
+                def read():
+                    with database.SessionLocal() as db:
+                        crud.get_ads(db, skip=rng.randrange(0, max(1, args.ads // len(TEAMS) - 100)),
+                                     limit=100, team=rng.choice(TEAMS))
+                reads.timed(read)
+
+        def comment_writer():
+            rng = random.Random()
+            while not stop.is_set():
+                ad_id = f"bench{rng.randrange(args.ads):09d}"
+                comment = schemas.AdUpdate(planner_comment=f"note {rng.random():.6f}")
+                comments.timed(lambda: write(crud.update_ad_comments, ad_id, comment))
+                stop.wait(args.comment_interval)
+
+        def sync_writer():
+            rng = random.Random()
+            round_no = 0
+            while not stop.wait(args.sync_interval):
+                round_no += 1
+                start = rng.randrange(max(1, args.ads - args.sync_batch))
+                batch = [make_ad(n, reason=f"policy {round_no}") for n in range(start, start + args.sync_batch)]
+                syncs.timed(lambda: write(crud.bulk_upsert_ads, batch, deactivate_missing=False))
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        threads += [threading.Thread(target=comment_writer) for _ in range(args.writers)]
+        threads.append(threading.Thread(target=sync_writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    print(f"{mode:<7} {'reads':<9} {reads.summary(args.duration)}")
+    print(f"{'':<7} {'comments':<9} {comments.summary(args.duration)}")
+    print(f"{'':<7} {'syncs':<9} {syncs.summary(args.duration)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent read/write load on the SQLite database")
+    parser.add_argument("--ads", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2, help="threads updating comments")
+    parser.add_argument("--comment-interval", type=float, default=0.01, help="pause between comment updates per writer")
+    parser.add_argument("--sync-batch", type=int, default=2000, help="ads upserted per simulated sync")
+    parser.add_argument("--sync-interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mode", choices=("legacy", "wal", "both"), default="both")
+    args = parser.parse_args()
+
+    print(f"ads {args.ads}, readers {args.readers}, comment writers {args.writers}, "
+          f"sync batch {args.sync_batch} every {args.sync_interval}s, {args.duration}s per mode")
+    print(f"{'mode':<7} {'op':<9} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in (("legacy", "wal") if args.mode == "both" else (args.mode,)):
+        run_mode(mode, args)
+
+if __name__ == "__main__":
+    main()
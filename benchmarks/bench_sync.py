@@ -0,0 +1,134 @@
+# bench_sync.py
+# 동기화 처리량 벤치마크: 로컬 가짜 Graph API 서버를 상대로 scheduler.fetch_and_store_ads 를 실행하고
+# 벽시계 시간, API 호출 수, DB 쓰기 수, 최대 메모리를 보고한다
+#
+# 실행: python -m benchmarks.bench_sync --accounts 100 --ads 10000 --latency 0.05
+#       (첫 실행은 전체 동기화, 이후 --incremental-runs 만큼 증분 동기화)
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from benchmarks import fake_graph
+
+class WriteCounter:
+    # INSERT/UPDATE/DELETE 문 실행 수와 영향 받은 파라미터 행 수
+    def __init__(self, engine):
+        self.statements = 0
+        self.rows = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() not in ("INSERT", "UPDATE", "DELETE"):
+            return
+        self.statements += 1
+        self.rows += len(parameters) if executemany else 1
+
+    def reset(self):
+        self.statements = 0
+        self.rows = 0
+
+def configure(args, port: int, db_path: str):
+    # 앱 모듈을 가져오기 전에 가짜 서버와 벤치마크 계정으로 향하게 한다
+    os.environ["META_GRAPH_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("META_ACCESS_TOKEN", "bench-token")
+    for env_name, value in (
+        ("META_API_MAX_WORKERS", args.workers),
+        ("META_API_MAX_CONCURRENT_REQUESTS", args.max_concurrent),
+        ("META_API_MAX_REQUESTS_PER_ACCOUNT", args.per_account),
+    ):
+        if value is not None:
+            os.environ[env_name] = str(value)
+    os.environ.setdefault("GRAPH_RETRY_BASE_DELAY", "0.05")
+
+    from app import config, database, search
+
+    config.AD_ACCOUNTS.clear()
+    config.AD_ACCOUNTS.update(fake_graph.bench_accounts(args.accounts))
+
+    engine = database.create_sqlite_engine(f"sqlite:///{db_path}")
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+    with database.SessionLocal() as db:
+        search.ensure_search_index(db)
+    return engine
+
+def run_once(label: str, full: bool, port: int, writes: WriteCounter, trace_memory: bool):
+    from app import scheduler
+
+    fake_graph.fetch_stats(port, reset=True)
+    writes.reset()
+    if trace_memory:
+        tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    result = scheduler.fetch_and_store_ads(full=full)
+    elapsed = time.perf_counter() - started
+
+    stats = fake_graph.fetch_stats(port)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else float("nan")
+    print(
+        f"{label:<14} {elapsed:9.2f}s {stats['requests']:9d} {stats['errors']:7d} "
+        f"{writes.statements:9d} {writes.rows:10d} {peak:10.1f}   "
+        f"+{result['inserted']} ~{result['updated']} -{result['deactivated']}"
+        f"{' failed=' + str(len(result['failed_accounts'])) if result.get('failed_accounts') else ''}"
+    )
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch_and_store_ads against a local fake Graph API")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--ads", type=int, default=1000, help="ads per account")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--usage-pct", type=float, default=10.0)
+    parser.add_argument("--disapproved-ratio", type=float, default=0.9)
+    parser.add_argument("--changed-ratio", type=float, default=0.01)
+    parser.add_argument("--incremental-runs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-concurrent", type=int, default=None)
+    parser.add_argument("--per-account", type=int, default=None)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip peak memory tracking (faster)")
+    args = parser.parse_args()
+
+    server = fake_graph.start_server(
+        args.port,
+        ads_per_account=args.ads,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        usage_pct=args.usage_pct,
+        disapproved_ratio=args.disapproved_ratio,
+        changed_ratio=args.changed_ratio
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = configure(args, args.port, os.path.join(tmp, "bench.db"))
+            writes = WriteCounter(engine)
+            trace_memory = not args.no_tracemalloc
+            if trace_memory:
+                tracemalloc.start()
+
+            print(
+                f"accounts {args.accounts}, ads/account {args.ads}, latency {args.latency}s, "
+                f"errors {args.error_rate:.0%}, throttled {args.throttle_rate:.0%}"
+            )
+            print(f"{'run':<14} {'wall':>10} {'api calls':>9} {'api err':>7} {'db stmts':>9} {'db rows':>10} {'peak MiB':>10}   result")
+            run_once("full", True, args.port, writes, trace_memory)
+            for n in range(args.incremental_runs):
+                run_once(f"incremental {n + 1}", False, args.port, writes, trace_memory)
+
+            if trace_memory:
+                tracemalloc.stop()
+            engine.dispose()
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# fake_graph.py
+# 로컬 가짜 Graph API 서버 - 실제 Meta 없이 동기화 경로(MetaAdsAPI -> schemas.AdCreate -> crud)를 실행한다
+#
+# 계정/캠페인/광고 세트/광고는 ID에서 결정적으로 만들어지므로 메모리에 미리 올리지 않는다.
+# 지원하는 요청:
+#   GET /{version}/act_{account_id}/ads  (effective_status, updated_since, limit, after 커서)
+#   GET /{version}/?ids=a,b,c&fields=name
+#   GET /{version}/{object_id}?fields=name
+#   GET /__stats[?reset=1]               (요청/오류 수)
+#
+# 단독 실행: python -m benchmarks.fake_graph --port 8765 --ads 10000
+#           META_GRAPH_URL=http://127.0.0.1:8765 로 앱을 실행하면 이 서버를 사용한다
+#           (계정 ID는 ACCOUNT_ID_BASE + 번호 형태여야 한다 - bench_accounts() 참고)
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+# 합성 계정 ID는 ACCOUNT_ID_BASE + 계정 번호
+ACCOUNT_ID_BASE = 900000000000000
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+REJECT_REASONS = [
+    "허용되지 않는 비즈니스 관행",
+    "개인 건강 및 외모",
+    "오해의 소지가 있는 주장",
+    "성인용 콘텐츠",
+]
+
+def account_ids(count: int) -> list[str]:
+    return [str(ACCOUNT_ID_BASE + n) for n in range(count)]
+
+def bench_accounts(count: int, teams: int = 6) -> dict:
+    # config.AD_ACCOUNTS 와 같은 모양의 {team: {account_name: account_id}}
+    accounts = {}
+    for n, account_id in enumerate(account_ids(count)):
+        accounts.setdefault(f"team{n % teams}", {})[f"bench_account_{n}"] = account_id
+    return accounts
+
+class SyntheticGraph:
+    # ads_per_account 개의 광고 중 disapproved_ratio 비율이 DISAPPROVED,
+    # changed_ratio 비율은 서버 시작 시각에 수정된 것으로 보고되어 증분 동기화 대상이 된다
+    def __init__(
+        self,
+        ads_per_account: int,
+        campaigns_per_account: int = 20,
+        adsets_per_campaign: int = 5,
+        disapproved_ratio: float = 0.9,
+        changed_ratio: float = 0.01
+    ):
+        self.ads_per_account = ads_per_account
+        self.campaigns_per_account = max(1, campaigns_per_account)
+        self.adsets_per_campaign = max(1, adsets_per_campaign)
+        self.approved_every = self._every(1 - disapproved_ratio)
+        self.changed_every = self._every(changed_ratio)
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    @staticmethod
+    def _every(ratio: float) -> int:
+        # 비율을 "N개마다 하나" 로 바꾼다 (0이면 해당 없음)
+        return 0 if ratio <= 0 else max(1, round(1 / ratio))
+
+    def _is_disapproved(self, index: int) -> bool:
+        return not (self.approved_every and index % self.approved_every == 0)
+
+    def _updated_time(self, index: int) -> datetime:
+        # 승인 광고(index % approved_every == 0)와 겹치지 않도록 한 칸 밀어서 고른다
+        # (기본값에서는 changed_every 가 approved_every 의 배수라 수정된 광고가 모두 승인 광고가 된다)
+        if self.changed_every and (index + 1) % self.changed_every == 0:
+            return self.started_at
+        return BASE_TIME + timedelta(minutes=index)
+
+    def ad(self, account_index: int, index: int) -> dict:
+        campaign = index % self.campaigns_per_account
+        adset = campaign * self.adsets_per_campaign + (index // self.campaigns_per_account) % self.adsets_per_campaign
+        disapproved = self._is_disapproved(index)
+        ad = {
+            "id": f"{account_index + 1}{index:09d}",
+            "name": f"ad_{account_index}_{index}",
+            "campaign_id": f"{account_index + 1}1{campaign:06d}",
+            "adset_id": f"{account_index + 1}2{adset:06d}",
+            "effective_status": "DISAPPROVED" if disapproved else "ACTIVE",
+            "updated_time": self._updated_time(index).strftime("%Y-%m-%dT%H:%M:%S+0000"),
+        }
+        if disapproved:
+            ad["ad_review_feedback"] = {"global": {REJECT_REASONS[index % len(REJECT_REASONS)]: "policy"}}
+        return ad
+
+    def ads_page(self, account_index: int, params: dict, limit: int, after: int):
+        # after: 다음에 볼 광고 번호 (커서는 이 번호를 그대로 사용한다)
+        statuses = params.get("effective_status")
+        statuses = set(json.loads(statuses)) if statuses else None
+        since = params.get("updated_since")
+        since = datetime.fromtimestamp(int(since), timezone.utc) if since else None
+
+        page = []
+        index = after
+        while index < self.ads_per_account and len(page) < limit:
+            ad = self.ad(account_index, index)
+            updated_time = self._updated_time(index)
+            index += 1
+            if statuses and ad["effective_status"] not in statuses:
+                continue
+            if since and updated_time <= since:
+                continue
+            page.append(ad)
+        return page, (index if index < self.ads_per_account else None)
+
+    @staticmethod
+    def name(object_id: str) -> str:
+        return f"name_{object_id}"
+
+def _make_handler(graph: SyntheticGraph, latency: float, error_rate: float, throttle_rate: float, usage_pct: float):
+    stats = {"requests": 0, "errors": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 헤더와 본문을 따로 쓰므로 Nagle 알고리즘을 끄지 않으면 요청마다 지연 ACK(~40ms)가 더해진다
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _usage_headers(self, pct: float, regain_minutes: int = 0) -> dict:
+            usage = {
+                "call_count": pct,
+                "total_cputime": pct / 2,
+                "total_time": pct / 2,
+                "type": "ads_management",
+                "estimated_time_to_regain_access": regain_minutes
+            }
+            return {"x-business-use-case-usage": json.dumps({"0": [usage]})}
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            parts = [part for part in url.path.split("/") if part]
+
+            if parts == ["__stats"]:
+                with lock:
+                    body = dict(stats)
+                    if params.get("reset"):
+                        stats.update(requests=0, errors=0)
+                return self._send(200, body)
+
+            with lock:
+                stats["requests"] += 1
+            if latency:
+                time.sleep(random.uniform(0.5, 1.5) * latency)
+
+            roll = random.random()
+            if roll < error_rate:
+                with lock:
+                    stats["errors"] += 1
+                return self._send(500, {"error": {
+                    "message": "An unexpected error has occurred.",
+                    "code": 2,
+                    "is_transient": True
+                }})
+            if roll < error_rate + throttle_rate:
+                with lock:
+                    stats["errors"] += 1
+                return self._send(400, {"error": {
+                    "message": "There have been too many calls from this ad-account.",
+                    "code": 80004
+                }}, self._usage_headers(100))
+
+            headers = self._usage_headers(usage_pct)
+            # /{version}/act_{id}/ads
+            if len(parts) == 3 and parts[1].startswith("act_") and parts[2] == "ads":
+                account_index = int(parts[1][len("act_"):]) - ACCOUNT_ID_BASE
+                limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                after = int(params.get("after", 0))
+                data, next_after = graph.ads_page(account_index, params, limit, after)
+                paging = {"cursors": {"before": str(after), "after": str(next_after or after)}}
+                if next_after is not None:
+                    next_params = dict(params, after=str(next_after))
+                    paging["next"] = f"http://{self.headers['Host']}{url.path}?{urlencode(next_params)}"
+                return self._send(200, {"data": data, "paging": paging}, headers)
+
+            # /{version}/?ids=...
+            if len(parts) == 1 and "ids" in params:
+                ids = [object_id for object_id in params["ids"].split(",") if object_id]
+                return self._send(200, {
+                    object_id: {"id": object_id, "name": graph.name(object_id)} for object_id in ids
+                }, headers)
+
+            # /{version}/{object_id}
+            if len(parts) == 2:
+                return self._send(200, {"id": parts[1], "name": graph.name(parts[1])}, headers)
+
+            self._send(404, {"error": {"message": f"Unsupported path {url.path}", "code": 100}})
+
+    return Handler
+
+def serve(
+    port: int,
+    ads_per_account: int,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    usage_pct: float = 10.0,
+    disapproved_ratio: float = 0.9,
+    changed_ratio: float = 0.01
+):
+    graph = SyntheticGraph(ads_per_account, disapproved_ratio=disapproved_ratio, changed_ratio=changed_ratio)
+    handler = _make_handler(graph, latency, error_rate, throttle_rate, usage_pct)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+def start_server(port: int, **options) -> Process:
+    # 벤치마크 프로세스의 CPU/메모리 측정에 섞이지 않도록 별도 프로세스에서 실행한다
+    process = Process(target=serve, args=(port,), kwargs=options, daemon=True)
+    process.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            fetch_stats(port)
+            return process
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError("fake Graph API server did not start")
+            time.sleep(0.05)
+
+def fetch_stats(port: int, reset: bool = False) -> dict:
+    query = "?reset=1" if reset else ""
+    with urlopen(f"http://127.0.0.1:{port}/__stats{query}", timeout=5) as response:
+        return json.loads(response.read())
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Meta Graph API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ads", type=int, default=10000, help="ads per account")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="ratio of transient 5xx responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="ratio of rate-limit responses")
+    parser.add_argument("--usage-pct", type=float, default=10.0, help="reported usage percent")
+    args = parser.parse_args()
+
+    print(f"fake Graph API on http://127.0.0.1:{args.port} ({args.ads} ads per account)")
+    serve(
+        args.port, args.ads,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        usage_pct=args.usage_pct
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,38 @@
 # main.py
 import csv
+import json
 from datetime import datetime
 from io import StringIO
 from fastapi import FastAPI, Depends, HTTPException, Query, Request, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 import os
-import ipaddress
+import tempfile
 from dotenv import load_dotenv
 
-from app import models, crud, schemas, backup
-from app.database import SessionLocal, engine
-from app.scheduler import init_scheduler
-from app.meta_api import MetaAdsAPI
-
-# .env 파일 로드
+# .env 파일 로드 (DATABASE_URL 등 app 모듈이 가져올 때 읽는 설정보다 먼저)
 load_dotenv()
 
+from app import models, crud, schemas, backup, metrics
+from app.database import SessionLocal, init_db, db_writer
+from app.pagination import encode_cursor, decode_cursor
+from app.cache import response_cache
+from app.ip_access import IPRestrictionMiddleware
+from app.live_updates import change_feed
+from app.scheduler import init_scheduler, shutdown_scheduler, scheduler_election, sync_jobs
+
 # 환경변수에서 허용 IP 목록 가져오기
 ALLOWED_IPS = os.getenv("ALLOWED_IPS", "").split(",")
 ALLOWED_IP_RANGES = os.getenv("ALLOWED_IP_RANGES", "").split(",")
 
-class IPRestrictionMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.allowed_ips = set(ip.strip() for ip in ALLOWED_IPS if ip.strip())
-        self.allowed_ip_ranges = []
-        
-        # IP 범위 처리
-        for ip_range in ALLOWED_IP_RANGES:
-            if ip_range.strip():
-                try:
-                    self.allowed_ip_ranges.append(ipaddress.ip_network(ip_range.strip()))
-                except ValueError as e:
-                    print(f"Invalid IP range format: {ip_range}, error: {e}")
-
-    async def dispatch(self, request: Request, call_next):
-        # client IP 주소 가져오기
-        client_ip = request.client.host
-        
-        # Render의 프록시를 통과한 실제 클라이언트 IP 확인
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-            
-        # IP 검사
-        if not self._is_ip_allowed(client_ip):
-            print(f"Access Denied for IP: {client_ip}")
-            return JSONResponse(
-                status_code=403,
-                content={
-                    "detail": f"Access denied. Your IP ({client_ip}) is not in the allowed list."
-                }
-            )
-        
-        print(f"Access Granted for IP: {client_ip}")
-        return await call_next(request)
-    
-    def _is_ip_allowed(self, ip: str) -> bool:
-        if not self.allowed_ips and not self.allowed_ip_ranges:
-            return True
-            
-        if ip in self.allowed_ips:
-            return True
-            
-        try:
-            client_ip = ipaddress.ip_address(ip)
-            for ip_range in self.allowed_ip_ranges:
-                if client_ip in ip_range:
-                    return True
-        except ValueError:
-            return False
-            
-        return False
-
 # 터미널에 uvicorn main:app --reload 로 실행
 app = FastAPI(title="Meta Ads Monitor")
 
@@ -92,8 +45,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 라우트별 지연 시간 측정 (IP 제한을 통과한 요청만)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # IP 제한 미들웨어 추가
-app.add_middleware(IPRestrictionMiddleware)
+app.add_middleware(
+    IPRestrictionMiddleware,
+    allowed_ips=ALLOWED_IPS,
+    allowed_ip_ranges=ALLOWED_IP_RANGES
+)
 
 # 정적 파일 서빙 설정
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -101,8 +61,8 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # 템플릿 설정
 templates = Jinja2Templates(directory="templates")
 
-# 데이터베이스 초기화
-models.Base.metadata.create_all(bind=engine)
+# 데이터베이스 초기화 (테이블 및 누락된 인덱스 생성, 일별 집계/검색 색인 채우기)
+init_db()
 
 # Dependency
 def get_db():
@@ -114,8 +74,13 @@ def get_db():
 
 @app.on_event("startup")
 async def startup_event():
+    # 여러 워커로 실행해도 스케줄 작업은 리더로 선출된 한 프로세스에서만 실행된다
     init_scheduler()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_scheduler()
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse(
@@ -130,127 +95,286 @@ async def read_statistics(request: Request):
         {"request": request}
     )
 
-@app.get("/ads/", response_model=List[schemas.Ad])
+def serialize_ad(ad: models.Ad):
+    return {
+        "id": ad.id,
+        "team": ad.team,
+        "campaign": ad.campaign,
+        "adgroup": ad.adgroup,
+        "ad_id": ad.ad_id,
+        "ad_name": ad.ad_name,
+        "account_name": ad.account_name,
+        "reject_reason": ad.reject_reason,
+        "planner_comment": ad.planner_comment,
+        "executor_comment": ad.executor_comment,
+        "last_modified": ad.last_modified,
+        "is_active": ad.is_active,
+        "created_at": ad.created_at
+    }
+
+def cached_json_response(request: Request, produce):
+    # 같은 경로/쿼리 파라미터의 응답은 데이터 버전이 바뀔 때까지 캐시에서 돌려준다
+    # 브라우저가 보낸 If-None-Match 가 현재 ETag 와 같으면 본문 없이 304 를 응답한다
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    cached = response_cache.get(key)
+    if cached is None:
+        version = response_cache.version
+        body = json.dumps(
+            jsonable_encoder(produce()),
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        cached = response_cache.set(key, body, version)
+
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def parse_cursor(cursor: str, size: int) -> list:
+    # 빈 문자열은 첫 페이지를 의미한다
+    if not cursor:
+        return None
+    try:
+        values = decode_cursor(cursor)
+    except ValueError:
+        values = None
+    if values is None or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+live_subscribers = metrics.Gauge(
+    "live_update_subscribers", "Open dashboard SSE connections", function=change_feed.subscriber_count
+)
+scheduler_leader = metrics.Gauge(
+    "scheduler_leader", "1 if this worker process runs the scheduled jobs",
+    function=lambda: int(scheduler_election.is_leader)
+)
+
+@app.get("/metrics")
+def read_metrics():
+    # Prometheus 텍스트 형식
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/ads/", response_model=Union[List[schemas.Ad], schemas.AdPage])
 def read_ads(
+    request: Request,
     skip: int = Query(default=0, ge=0),
-    limit: int = Query(default=100, le=1000),
+    limit: int = Query(default=100, ge=1, le=1000),
     team: Optional[str] = None, 
     active_only: bool = Query(default=True),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="커서 페이지네이션: 첫 페이지는 빈 값, 이후에는 응답의 next_cursor"
+    ),
     db: Session = Depends(get_db)
 ):
-    ads = crud.get_ads(
-        db, 
-        skip=skip, 
-        limit=limit, 
-        team=team, 
-        active_only=active_only
+    def produce():
+        # cursor 파라미터가 없으면 기존과 같이 OFFSET 방식의 목록을 반환한다
+        if cursor is None:
+            ads = crud.get_ads(
+                db, 
+                skip=skip, 
+                limit=limit, 
+                team=team, 
+                active_only=active_only
+            )
+            return [serialize_ad(ad) for ad in ads]
+
+        position = parse_cursor(cursor, 1)
+        if position and not isinstance(position[0], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        ads = crud.get_ads(
+            db,
+            limit=limit + 1,
+            team=team,
+            active_only=active_only,
+            after_id=position[0] if position else None
+        )
+        next_cursor = encode_cursor(ads[limit - 1].id) if len(ads) > limit else None
+        return {
+            "items": [serialize_ad(ad) for ad in ads[:limit]],
+            "next_cursor": next_cursor
+        }
+
+    return cached_json_response(request, produce)
+
+@app.get("/ads/stream")
+async def stream_ad_changes(request: Request, team: Optional[str] = None):
+    # 대시보드용 Server-Sent Events: 동기화/의견 수정으로 바뀐 행만 보낸다
+    # 재연결 시 브라우저가 보내는 Last-Event-ID 이후의 변경을 이어서 받는다
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return StreamingResponse(
+        change_feed.stream(team=team, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    
-    response_data = [
-        {
-            "id": ad.id,
-            "team": ad.team,
-            "campaign": ad.campaign,
-            "adgroup": ad.adgroup,
-            "ad_id": ad.ad_id,
-            "ad_name": ad.ad_name,
-            "account_name": ad.account_name,
-            "reject_reason": ad.reject_reason,
-            "planner_comment": ad.planner_comment,
-            "executor_comment": ad.executor_comment,
-            "last_modified": ad.last_modified,
-            "is_active": ad.is_active,
-            "created_at": ad.created_at
-        } for ad in ads
-    ]
-    
-    return response_data
 
-@app.get("/ads/refresh")
-async def refresh_ads(
+@app.get("/ads/changes", response_model=schemas.AdChangePage)
+def read_ad_changes(
     request: Request,
+    since: Optional[str] = Query(
+        default=None,
+        description="이전 응답의 next_cursor. 없으면 변경 없이 현재 기준점만 돌려준다"
+    ),
+    team: Optional[str] = None,
+    limit: int = Query(default=500, ge=1, le=5000),
     db: Session = Depends(get_db)
 ):
-    try:
-        meta_api = MetaAdsAPI()
-        rejected_ads = meta_api.get_all_rejected_ads()
-        
-        current_ad_ids = []
-        
-        for ad_data in rejected_ads:
-            current_ad_ids.append(ad_data['ad_id'])
-            ad = schemas.AdCreate(**ad_data)
-            crud.create_or_update_ad(db=db, ad=ad)
-        
-        crud.deactivate_old_ads(db, current_ad_ids)
-        
-        return {"status": "success", "message": "Ads refreshed successfully"}
+    # 커서 이후에 추가/수정/비활성화된 광고만 돌려준다
+    # 같은 광고가 여러 번 바뀌었으면 마지막 상태 하나로 합친다
+    def produce():
+        min_seq, max_seq = crud.get_ad_change_bounds(db)
+        if since is None:
+            return {"changes": [], "next_cursor": encode_cursor(max_seq or 0), "has_more": False}
+
+        after_seq = parse_cursor(since, 1)[0] if since else 0
+        if not isinstance(after_seq, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # 보관 기간이 지나 지워졌거나 복원 등으로 로그가 바뀐 커서는 이어서 받을 수 없다
+        if (min_seq is not None and after_seq + 1 < min_seq) or after_seq > (max_seq or 0):
+            raise HTTPException(status_code=410, detail="Cursor expired, reload all ads")
+
+        rows = crud.get_ad_changes(db, after_seq, team=team, limit=limit)
+        latest = {}
+        inserted = set()
+        for row in rows:
+            latest.pop(row.ad_id, None)
+            latest[row.ad_id] = row
+            if row.op == models.AdChange.INSERT:
+                inserted.add(row.ad_id)
+        ads = crud.get_ads_by_ids(db, latest)
+
+        changes = []
+        for ad_id, row in latest.items():
+            ad = ads.get(ad_id)
+            if ad is None or not ad.is_active or (team and ad.team != team):
+                changes.append({
+                    "seq": row.seq,
+                    "op": models.AdChange.DEACTIVATE,
+                    "ad_id": ad_id,
+                    "team": row.team,
+                    "ad": None
+                })
+                continue
+            changes.append({
+                "seq": row.seq,
+                "op": models.AdChange.INSERT if ad_id in inserted else models.AdChange.UPDATE,
+                "ad_id": ad_id,
+                "team": ad.team,
+                "ad": serialize_ad(ad)
+            })
+        return {
+            "changes": changes,
+            "next_cursor": encode_cursor(rows[-1].seq if rows else after_seq),
+            "has_more": len(rows) == limit
+        }
+
+    return cached_json_response(request, produce)
+
+@app.get("/ads/refresh", status_code=202)
+async def refresh_ads(request: Request):
+    # 동기화는 백그라운드 작업으로 실행하고 작업 ID를 바로 돌려준다
+    # 이미 진행 중인 동기화가 있으면 그 작업에 합쳐진다
+    job, created = sync_jobs.submit("manual")
+    return {
+        "status": "accepted",
+        "message": "Ads refresh started" if created else "Ads refresh already in progress",
+        "job_id": job["job_id"],
+        "merged": not created
+    }
+
+@app.get("/ads/refresh/latest")
+async def latest_refresh_job():
+    job = sync_jobs.latest()
+    if job is None:
+        raise HTTPException(status_code=404, detail="No refresh job found")
+    return job
+
+@app.get("/ads/refresh/{job_id}")
+async def refresh_job_status(job_id: str):
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
     
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={
-                "status": "error",
-                "message": f"Failed to refresh ads: {str(e)}"
-            }
+
+# CSV 내보내기 시 한 번에 인코딩해 전송할 행 수
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_HEADERS = [
+    "계정", "캠페인", "광고 그룹", "광고", 
+    "거절 사유", "마지막 수정일", "기획팀 의견", "집행팀 의견"
+]
+
+def iter_ads_csv(team: Optional[str], start_dt: Optional[datetime], end_dt: Optional[datetime]):
+    # 스트리밍 응답이 끝날 때까지 세션을 유지해야 하므로 제너레이터 안에서 직접 연다
+    db = SessionLocal()
+    try:
+        output = StringIO()
+        writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+
+        def flush():
+            data = output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate(0)
+            return data
+
+        # BOM + 헤더를 먼저 전송
+        output.write('\ufeff')
+        writer.writerow(EXPORT_HEADERS)
+        yield flush()
+
+        rows = crud.iter_ad_export_rows(
+            db,
+            team=team,
+            start_date=start_dt,
+            end_date=end_dt,
+            chunk_size=EXPORT_CHUNK_SIZE
         )
-    
+        for count, row in enumerate(rows, start=1):
+            (account_name, campaign, adgroup, ad_name, reject_reason,
+             last_modified, planner_comment, executor_comment) = row
+            writer.writerow([
+                account_name,
+                campaign,
+                adgroup,
+                ad_name,
+                reject_reason,
+                last_modified.strftime("%Y-%m-%d %H:%M:%S") if last_modified else "",
+                planner_comment or "",
+                executor_comment or ""
+            ])
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield flush()
+
+        remaining = flush()
+        if remaining:
+            yield remaining
+    finally:
+        db.close()
 
 @app.get("/ads/export")
 def export_ads_csv(
     team: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    end_date: Optional[str] = None
 ):
     # 날짜 변환
     start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
     end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
     
-    # 데이터 조회
-    ads = crud.get_ad_history(
-        db,
-        team=team,
-        start_date=start_dt,
-        end_date=end_dt,
-        skip=0,
-        limit=None
-    )
-    
-    # CSV 데이터 생성 (명시적으로 쉼표 구분자 지정)
-    output = StringIO()
-    writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-    
-    # BOM 추가
-    output.write('\ufeff')
-    
-    # 헤더 작성
-    writer.writerow([
-        "계정", "캠페인", "광고 그룹", "광고", 
-        "거절 사유", "마지막 수정일", "기획팀 의견", "집행팀 의견"
-    ])
-    
-    # 데이터 작성
-    for ad in ads:
-        writer.writerow([
-            ad.account_name,
-            ad.campaign,
-            ad.adgroup,
-            ad.ad_name,
-            ad.reject_reason,
-            ad.last_modified.strftime("%Y-%m-%d %H:%M:%S") if ad.last_modified else "",
-            ad.planner_comment or "",
-            ad.executor_comment or ""
-        ])
-    
-    # StringIO의 내용을 UTF-8로 인코딩
-    csv_string = output.getvalue()
-    
     # 파일 이름 생성
     filename = f"ads_report_{team or 'all'}_{datetime.now().strftime('%Y%m%d')}.csv"
     
     return StreamingResponse(
-        iter([csv_string.encode('utf-8-sig')]),
+        iter_ads_csv(team, start_dt, end_dt),
         media_type="text/csv",
         headers={
             "Content-Disposition": f"attachment; filename={filename}",
@@ -258,30 +382,118 @@ def export_ads_csv(
         }
     )
     
-@app.get("/ads/history", response_model=List[schemas.Ad])
+@app.get("/ads/history", response_model=Union[List[schemas.Ad], schemas.AdPage])
 def read_ad_history(
     request: Request,
     team: Optional[str] = None,
     start_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
     skip: int = Query(default=0, ge=0),
-    limit: int = Query(default=100, le=1000),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="커서 페이지네이션: 첫 페이지는 빈 값, 이후에는 응답의 next_cursor"
+    ),
+    db: Session = Depends(get_db)
+):
+    def produce():
+        # 날짜 문자열을 datetime 객체로 변환
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+    
+        if cursor is None:
+            history = crud.get_ad_history(
+                db,
+                team=team,
+                start_date=start_dt,
+                end_date=end_dt,
+                skip=skip,
+                limit=limit
+            )
+        
+            return [serialize_ad(ad) for ad in history]
+
+        position = parse_cursor(cursor, 2)
+        before = None
+        if position:
+            try:
+                before = (datetime.fromisoformat(position[0]), int(position[1]))
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        history = crud.get_ad_history(
+            db,
+            team=team,
+            start_date=start_dt,
+            end_date=end_dt,
+            limit=limit + 1,
+            before=before
+        )
+        next_cursor = None
+        if len(history) > limit:
+            last = history[limit - 1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return {
+            "items": [serialize_ad(ad) for ad in history[:limit]],
+            "next_cursor": next_cursor
+        }
+
+    return cached_json_response(request, produce)
+
+@app.get("/ads/search", response_model=List[schemas.Ad])
+def search_ads(
+    request: Request,
+    q: str = Query(..., min_length=1, description="검색어 (공백으로 구분한 모든 단어를 포함)"),
+    team: Optional[str] = None,
+    start_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
+    active: Optional[bool] = Query(None, description="true: 활성 광고만, false: 비활성 광고만"),
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    # 광고 이름, 캠페인, 광고 그룹, 계정, 거절 사유, 의견 전문 검색 (관련도 순)
+    def produce():
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+        ads = crud.search_ads(
+            db,
+            q,
+            team=team,
+            start_date=start_dt,
+            end_date=end_dt,
+            active=active,
+            skip=skip,
+            limit=limit
+        )
+        return [serialize_ad(ad) for ad in ads]
+
+    return cached_json_response(request, produce)
+
+@app.get("/ads/events", response_model=List[schemas.AdRejectionEvent])
+def read_rejection_events(
+    team: Optional[str] = None,
+    account_name: Optional[str] = None,
+    event_type: Optional[str] = None,
+    start_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format: YYYY-MM-DD"),
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    # 날짜 문자열을 datetime 객체로 변환
     start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
     end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
-    
-    history = crud.get_ad_history(
+
+    return crud.get_rejection_events(
         db,
         team=team,
+        account_name=account_name,
+        event_type=event_type,
         start_date=start_dt,
         end_date=end_dt,
         skip=skip,
         limit=limit
     )
-    
-    return history
 
 @app.get("/ads/team-stats")
 def read_team_stats(
@@ -293,47 +505,66 @@ def read_team_stats(
     start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
     end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
     
-    stats = crud.get_team_rejection_stats(db, start_dt, end_dt)
-    
-    return {
-        "team_stats": [
-            {
-                "team": stat.team,
-                "total_rejections": stat.total_rejections,
-                "affected_campaigns": stat.affected_campaigns,
-                "common_reasons": stat.common_reasons
-            }
-            for stat in stats
-        ]
-    }
+    def produce():
+        stats = crud.get_team_rejection_stats(db, start_dt, end_dt)
+        
+        return {"team_stats": stats}
+
+    return cached_json_response(request, produce)
     
 @app.get("/admin/backup")
 async def create_backup():
-    success, message = backup.backup_database()
+    # 백업은 블로킹 I/O 이므로 이벤트 루프 밖에서 실행
+    success, message = await run_in_threadpool(backup.backup_database)
     if success:
         return {"status": "success", "message": message}
     return {"status": "error", "message": message}
 
+@app.get("/admin/backup/status")
+async def backup_status():
+    return backup.backup_progress
+
+@app.get("/admin/backups")
+async def list_backups():
+    backups = await run_in_threadpool(backup.list_backups)
+    return [
+        {
+            "timestamp": item["timestamp"],
+            "created_at": item["created_at"],
+            "kind": item["kind"],
+            "size": item["size"],
+            "base": item["base"]
+        }
+        for item in reversed(backups)
+    ]
+
 @app.get("/admin/restore")
-async def restore_backup():
-    success, message = backup.restore_latest_backup()
+async def restore_backup(timestamp: Optional[str] = None):
+    success, message = await run_in_threadpool(backup.restore_latest_backup, timestamp)
     if success:
         return {"status": "success", "message": message}
     return {"status": "error", "message": message}
 
 @app.get("/admin/download-backup")
-async def download_backup():
-    backup_files = [f for f in os.listdir('./backups') if f.startswith('db_backup_')]
-    if not backup_files:
+async def download_backup(timestamp: Optional[str] = None):
+    # 압축/증분 백업은 요청한 시점의 DB 파일로 재구성해 내려준다
+    target = backup.find_backup(await run_in_threadpool(backup.list_backups), timestamp)
+    if target is None:
         return {"error": "No backup files found"}
-        
-    latest_backup = max(backup_files)
-    file_path = os.path.join('./backups', latest_backup)
+
+    fd, file_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        await run_in_threadpool(backup.materialize_backup, target["timestamp"], file_path)
+    except Exception as e:
+        os.unlink(file_path)
+        return {"error": f"Failed to prepare backup: {str(e)}"}
     
     return FileResponse(
         path=file_path,
-        filename=latest_backup,
-        media_type='application/octet-stream'
+        filename=f"db_backup_{target['timestamp']}.db",
+        media_type='application/octet-stream',
+        background=BackgroundTask(os.unlink, file_path)
     )
 
 @app.post("/admin/restore-upload")
@@ -356,8 +587,11 @@ def update_ad_comments(
     if not ad:
         raise HTTPException(status_code=404, detail="Ad not found")
     
-    updated_ad = crud.update_ad_comments(db, ad_id, comments)
-    return updated_ad
+    # 쓰기는 동기화 저장과 같은 쓰기 스레드에서 차례로 실행된다
+    updated_ad = db_writer.transaction(crud.update_ad_comments, ad_id, comments)
+    if not updated_ad:
+        raise HTTPException(status_code=404, detail="Ad not found")
+    return serialize_ad(updated_ad)
 
 if __name__ == "__main__":
     import uvicorn
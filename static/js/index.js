@@ -1,5 +1,15 @@
 let currentTeam = 'team1';
 let editingCell = null;
+
+// 실시간 변경(SSE) 상태: 표를 불러오는 동안 도착한 변경은 모아 두었다가 반영한다
+// pendingChanges 는 불러오는 중에만 배열이고, 불러오기에 실패하면 null 로 돌려 더 쌓지 않는다
+// 모아 둔 변경이 MAX_PENDING_CHANGES 를 넘으면 버리고 불러오기가 끝난 뒤 표 전체를 다시 불러온다
+const MAX_PENDING_CHANGES = 5000;
+let liveSource = null;
+let liveTeam = null;
+let tableReady = false;
+let pendingChanges = null;
+let pendingOverflow = false;
         
 document.addEventListener('DOMContentLoaded', () => {
     loadTeamData('team1');
@@ -63,6 +73,13 @@ async function loadTeamData(team) {
     loading.style.display = 'block';
     tableBody.innerHTML = '';
 
+    tableReady = false;
+    pendingChanges = [];
+    pendingOverflow = false;
+    if (liveTeam !== team) {
+        connectLiveUpdates(team);
+    }
+
     try {
         const url = team === 'all' ? '/ads/' : `/ads/?team=${team}`;
         const response = await axios.get(url);
@@ -73,49 +90,22 @@ async function loadTeamData(team) {
             console.log('Planner comment:', ad.planner_comment);
             console.log('Executor comment:', ad.executor_comment);
             
-            const row = document.createElement('tr');
-            row.innerHTML = `
-                <td>${ad.account_name || ''}</td>
-                <td>${ad.campaign || ''}</td>
-                <td>${ad.adgroup || ''}</td>
-                <td>${ad.ad_name || ''}</td>
-                <td>${ad.reject_reason || ''}</td>
-                <td>${new Date(ad.last_modified).toLocaleString('ko-KR')}</td>
-                <td class="comment-cell">
-                    <div class="comment-display">
-                        <span class="comment-text">${ad.planner_comment || ''}</span>
-                        <button class="edit-button" onclick="startEditing('${ad.ad_id}', 'planner')">
-                            ✏️
-                        </button>
-                    </div>
-                    <div class="comment-edit" style="display: none;">
-                        <textarea class="comment-input planner-comment" data-ad-id="${ad.ad_id}">${ad.planner_comment || ''}</textarea>
-                        <div class="edit-buttons">
-                            <button class="save-button" onclick="saveComments('${ad.ad_id}')">저장</button>
-                            <button class="cancel-button" onclick="cancelEditing('${ad.ad_id}', 'planner')">취소</button>
-                        </div>
-                    </div>
-                </td>
-                <td class="comment-cell">
-                    <div class="comment-display">
-                        <span class="comment-text">${ad.executor_comment || ''}</span>
-                        <button class="edit-button" onclick="startEditing('${ad.ad_id}', 'executor')">
-                            ✏️
-                        </button>
-                    </div>
-                    <div class="comment-edit" style="display: none;">
-                        <textarea class="comment-input executor-comment" data-ad-id="${ad.ad_id}">${ad.executor_comment || ''}</textarea>
-                        <div class="edit-buttons">
-                            <button class="save-button" onclick="saveComments('${ad.ad_id}')">저장</button>
-                            <button class="cancel-button" onclick="cancelEditing('${ad.ad_id}', 'executor')">취소</button>
-                        </div>
-                    </div>
-                </td>
-            `;
-            tableBody.appendChild(row);
+            tableBody.appendChild(createAdRow(ad));
         });
 
+        // 조회하는 동안 도착한 실시간 변경을 반영 (너무 많이 밀렸으면 다시 불러온다)
+        if (pendingOverflow) {
+            pendingChanges = null;
+            await loadTeamData(team);
+            return;
+        }
+        tableReady = true;
+        const changes = pendingChanges;
+        pendingChanges = null;
+        applyChanges(changes);
+
     } catch (error) {
+        pendingChanges = null;
         console.error('Error details:', error);
         console.error('Error response:', error.response);
         tableBody.innerHTML = `
@@ -130,6 +120,128 @@ async function loadTeamData(team) {
     }
 }
 
+function createAdRow(ad) {
+    const row = document.createElement('tr');
+    row.dataset.adId = ad.ad_id;
+    row.innerHTML = `
+        <td>${ad.account_name || ''}</td>
+        <td>${ad.campaign || ''}</td>
+        <td>${ad.adgroup || ''}</td>
+        <td>${ad.ad_name || ''}</td>
+        <td>${ad.reject_reason || ''}</td>
+        <td>${new Date(ad.last_modified).toLocaleString('ko-KR')}</td>
+        <td class="comment-cell">
+            <div class="comment-display">
+                <span class="comment-text">${ad.planner_comment || ''}</span>
+                <button class="edit-button" onclick="startEditing('${ad.ad_id}', 'planner')">
+                    ✏️
+                </button>
+            </div>
+            <div class="comment-edit" style="display: none;">
+                <textarea class="comment-input planner-comment" data-ad-id="${ad.ad_id}">${ad.planner_comment || ''}</textarea>
+                <div class="edit-buttons">
+                    <button class="save-button" onclick="saveComments('${ad.ad_id}')">저장</button>
+                    <button class="cancel-button" onclick="cancelEditing('${ad.ad_id}', 'planner')">취소</button>
+                </div>
+            </div>
+        </td>
+        <td class="comment-cell">
+            <div class="comment-display">
+                <span class="comment-text">${ad.executor_comment || ''}</span>
+                <button class="edit-button" onclick="startEditing('${ad.ad_id}', 'executor')">
+                    ✏️
+                </button>
+            </div>
+            <div class="comment-edit" style="display: none;">
+                <textarea class="comment-input executor-comment" data-ad-id="${ad.ad_id}">${ad.executor_comment || ''}</textarea>
+                <div class="edit-buttons">
+                    <button class="save-button" onclick="saveComments('${ad.ad_id}')">저장</button>
+                    <button class="cancel-button" onclick="cancelEditing('${ad.ad_id}', 'executor')">취소</button>
+                </div>
+            </div>
+        </td>
+    `;
+    return row;
+}
+
+function connectLiveUpdates(team) {
+    if (liveSource) {
+        liveSource.close();
+    }
+    liveTeam = team;
+    liveSource = new EventSource(team === 'all' ? '/ads/stream' : `/ads/stream?team=${encodeURIComponent(team)}`);
+
+    liveSource.addEventListener('changes', (event) => {
+        const data = JSON.parse(event.data);
+        if (tableReady) {
+            applyChanges(data.changes);
+            return;
+        }
+        // 불러오기에 실패한 표에는 쌓지 않는다 (다시 불러오면 최신 상태를 받는다)
+        if (pendingChanges === null) return;
+        pendingChanges.push(...data.changes);
+        if (pendingChanges.length > MAX_PENDING_CHANGES) {
+            pendingChanges = [];
+            pendingOverflow = true;
+        }
+    });
+
+    // 서버가 따라잡을 수 없는 변경(복원 등)을 알리면 표 전체를 다시 불러온다
+    liveSource.addEventListener('reset', () => {
+        loadTeamData(currentTeam);
+    });
+}
+
+function findAdRow(adId) {
+    return document.querySelector(`#adsTable tr[data-ad-id="${CSS.escape(adId)}"]`);
+}
+
+function applyChanges(changes) {
+    const tableBody = document.getElementById('adsTable');
+
+    changes.forEach(change => {
+        if (change.op === 'deactivate') {
+            const row = findAdRow(change.ad_id);
+            if (row) row.remove();
+            return;
+        }
+
+        const ad = change.ad;
+        const row = findAdRow(ad.ad_id);
+        if ((currentTeam !== 'all' && ad.team !== currentTeam) || ad.is_active === false) {
+            if (row) row.remove();
+            return;
+        }
+        if (!row) {
+            // 의견 수정처럼 일부 필드만 담긴 변경은 표에 없는 광고를 추가하지 않는다
+            if (ad.is_active) tableBody.appendChild(createAdRow(ad));
+            return;
+        }
+        patchAdRow(row, ad);
+    });
+}
+
+function patchAdRow(row, ad) {
+    const cells = row.children;
+    const textFields = ['account_name', 'campaign', 'adgroup', 'ad_name', 'reject_reason'];
+    textFields.forEach((field, index) => {
+        if (field in ad) cells[index].textContent = ad[field] || '';
+    });
+    if ('last_modified' in ad) {
+        cells[5].textContent = new Date(ad.last_modified).toLocaleString('ko-KR');
+    }
+
+    ['planner', 'executor'].forEach((type, offset) => {
+        const field = `${type}_comment`;
+        if (!(field in ad)) return;
+        const cell = cells[6 + offset];
+        cell.querySelector('.comment-text').textContent = ad[field] || '';
+        // 편집 중인 입력란은 덮어쓰지 않는다
+        const isEditing = editingCell && editingCell.adId === ad.ad_id && editingCell.type === type;
+        if (!isEditing) cell.querySelector('textarea').value = ad[field] || '';
+    });
+}
+
 function startEditing(adId, type) {
     const cell = document.querySelector(`td.comment-cell .${type}-comment[data-ad-id="${adId}"]`).closest('.comment-cell');
     const displayDiv = cell.querySelector('.comment-display');